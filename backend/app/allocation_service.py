@@ -0,0 +1,246 @@
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from .cache import LRUCache
+from .config import settings
+from .models import Investment, Recommendation, User
+from .risk_service import TRADING_DAYS, RiskService, risk_service
+
+SLEEVES = ("stocks", "bonds", "cash")
+ASSET_SLEEVES = {"stock": 0, "etf": 0, "mutual_fund": 0, "bond": 1, "cash": 2}
+PROFILES = ("conservative", "moderate", "aggressive")
+DESCRIPTIONS = {
+    "conservative": "Focus on capital preservation",
+    "moderate": "Balanced approach",
+    "aggressive": "Growth-focused"
+}
+MIN_AGE, MAX_AGE = 18, 100
+
+@lru_cache(maxsize=4)
+def risky_grid(step: float) -> np.ndarray:
+    stocks = np.linspace(0, 1, int(round(1 / step)) + 1)
+    return np.column_stack([stocks, 1 - stocks])
+
+def age_from_birth_date(birth_date: Optional[date]) -> Optional[int]:
+    if birth_date is None:
+        return None
+    today = date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+class AllocationService:
+    
+    def __init__(self, risk: RiskService):
+        self.risk = risk
+        self.tables = LRUCache(maxsize=8, ttl=86400)
+    
+    def sleeve_inputs(self) -> Tuple[np.ndarray, np.ndarray]:
+        prior = settings.ALLOCATION_PRIOR_RETURNS
+        mu = np.array([prior["stocks"], prior["bonds"], prior["cash"]])
+        vol = np.array([settings.ALLOCATION_PRIOR_VOLATILITY["stocks"], settings.ALLOCATION_PRIOR_VOLATILITY["bonds"], 0.0])
+        cov = np.diag(vol ** 2)
+        
+        proxies = [settings.ALLOCATION_PROXIES["stocks"], settings.ALLOCATION_PROXIES["bonds"]]
+        stats = self.risk.symbol_stats(proxies, settings.ALLOCATION_LOOKBACK_DAYS)
+        index = {symbol: i for i, symbol in enumerate(stats["symbols"])}
+        if all(proxy in index for proxy in proxies):
+            columns = [index[proxy] for proxy in proxies]
+            shrinkage = settings.ALLOCATION_RETURN_SHRINKAGE
+            # Sample means are noisy, so they are shrunk towards the prior returns
+            mu[:2] = shrinkage * mu[:2] + (1 - shrinkage) * stats["mean"][columns] * TRADING_DAYS
+            cov[:2, :2] = stats["cov"][np.ix_(columns, columns)] * TRADING_DAYS
+        return mu, cov
+    
+    @staticmethod
+    def risk_aversion(profiles: np.ndarray, ages: np.ndarray) -> np.ndarray:
+        base = np.array([settings.ALLOCATION_RISK_AVERSION[profile] for profile in PROFILES])[profiles]
+        return base * (1 + np.maximum(ages - 30, 0) / 30)
+    
+    @staticmethod
+    def cash_reserve(profiles: np.ndarray) -> np.ndarray:
+        return np.array([settings.ALLOCATION_CASH_RESERVE[profile] for profile in PROFILES])[profiles]
+    
+    @staticmethod
+    def with_reserve(risky: np.ndarray, reserve: np.ndarray) -> np.ndarray:
+        # Cash is held as a liquidity reserve rather than optimized, otherwise its zero variance dominates bonds
+        return np.column_stack([(1 - reserve)[:, None] * risky, reserve])
+    
+    @staticmethod
+    def mean_variance(mu: np.ndarray, cov: np.ndarray, aversion: np.ndarray) -> np.ndarray:
+        grid = risky_grid(settings.ALLOCATION_GRID_STEP)
+        variance = np.einsum("pi,ij,pj->p", grid, cov[:2, :2], grid)
+        utility = (grid @ mu[:2])[None, :] - 0.5 * aversion[:, None] * variance[None, :]
+        return grid[utility.argmax(axis=1)]
+    
+    @staticmethod
+    def risk_parity(cov: np.ndarray, count: int, iterations: int = 100) -> np.ndarray:
+        weights = np.full(2, 0.5)
+        for _ in range(iterations):
+            weights = 1 / (cov[:2, :2] @ weights)
+            weights /= weights.sum()
+        return np.tile(weights, (count, 1))
+    
+    def target_table(self, method: str) -> Dict[str, Any]:
+        key = (method, date.today().isoformat())
+        table = self.tables.get(key)
+        if table is not None:
+            return table
+        
+        mu, cov = self.sleeve_inputs()
+        profiles, ages = np.meshgrid(np.arange(len(PROFILES)), np.arange(MIN_AGE, MAX_AGE + 1), indexing="ij")
+        profiles, ages = profiles.ravel(), ages.ravel()
+        if method == "risk_parity":
+            risky = self.risk_parity(cov, len(profiles))
+        else:
+            risky = self.mean_variance(mu, cov, self.risk_aversion(profiles, ages))
+        weights = self.with_reserve(risky, self.cash_reserve(profiles))
+        table = {"weights": weights.reshape(len(PROFILES), MAX_AGE - MIN_AGE + 1, len(SLEEVES)), "mu": mu, "cov": cov}
+        self.tables.set(key, table)
+        return table
+    
+    def targets(self, profiles: np.ndarray, ages: np.ndarray, method: str) -> np.ndarray:
+        table = self.target_table(method)["weights"]
+        return table[profiles, np.clip(ages, MIN_AGE, MAX_AGE).astype(int) - MIN_AGE]
+    
+    @staticmethod
+    def rebalance(current: np.ndarray, targets: np.ndarray) -> Dict[str, np.ndarray]:
+        totals = current.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = np.where(totals[:, None] > 0, current / totals[:, None], 0)
+        return {
+            "totals": totals,
+            "weights": weights,
+            "drift": np.abs(weights - targets).max(axis=1),
+            "trades": targets * totals[:, None] - current
+        }
+    
+    @staticmethod
+    def _allocation(profile: str, age: int, age_assumed: bool, method: str, target: np.ndarray,
+                    plan: Dict[str, np.ndarray], row: int, mu: np.ndarray, cov: np.ndarray) -> Dict[str, Any]:
+        allocation = {sleeve: round(float(target[i]) * 100, 1) for i, sleeve in enumerate(SLEEVES)}
+        allocation.update({
+            "description": DESCRIPTIONS[profile],
+            "method": method,
+            "age": age,
+            "age_assumed": age_assumed,
+            "expected_return": round(float(target @ mu), 4),
+            "volatility": round(float(np.sqrt(target @ cov @ target)), 4),
+            "total_value": round(float(plan["totals"][row]), 2),
+            "current": {sleeve: round(float(plan["weights"][row, i]) * 100, 1) for i, sleeve in enumerate(SLEEVES)},
+            "drift": round(float(plan["drift"][row]), 4),
+            "trades": {sleeve: round(float(plan["trades"][row, i]), 2) for i, sleeve in enumerate(SLEEVES)}
+        })
+        return allocation
+    
+    def recommend(self, profile: str, birth_date: Optional[date], holdings: Iterable, method: str) -> Dict[str, Any]:
+        holdings = [(symbol, getattr(asset_type, "value", asset_type), float(value)) for symbol, asset_type, value in holdings]
+        age = age_from_birth_date(birth_date)
+        age_assumed = age is None
+        age = settings.ALLOCATION_DEFAULT_AGE if age_assumed else age
+        
+        current = np.zeros((1, len(SLEEVES)))
+        for _, asset_type, value in holdings:
+            current[0, ASSET_SLEEVES[asset_type]] += value
+        target = self.targets(np.array([PROFILES.index(profile)]), np.array([age]), method)
+        plan = self.rebalance(current, target)
+        table = self.target_table(method)
+        allocation = self._allocation(profile, age, age_assumed, method, target[0], plan, 0, table["mu"], table["cov"])
+        
+        # Scale every holding in a sleeve by the same factor; sleeves with nothing held are bought through the proxy
+        position_trades = []
+        sleeve_values = current[0]
+        for symbol, asset_type, value in holdings:
+            sleeve = ASSET_SLEEVES[asset_type]
+            if value > 0 and sleeve_values[sleeve] > 0:
+                amount = value * plan["trades"][0, sleeve] / sleeve_values[sleeve]
+                if abs(amount) >= 0.01:
+                    position_trades.append({"symbol": symbol, "amount": round(float(amount), 2)})
+        for sleeve, proxy in settings.ALLOCATION_PROXIES.items():
+            index = SLEEVES.index(sleeve)
+            if sleeve_values[index] <= 0 and plan["trades"][0, index] >= 0.01:
+                position_trades.append({"symbol": proxy, "amount": round(float(plan["trades"][0, index]), 2)})
+        allocation["position_trades"] = position_trades
+        return allocation
+    
+    @staticmethod
+    def recommendation_text(profile: str, allocation: Dict[str, Any]) -> str:
+        text = f"""Based on {profile} risk profile:
+{allocation['description']}
+
+Recommended:
+- Stocks: {allocation['stocks']}%
+- Bonds: {allocation['bonds']}%
+- Cash: {allocation['cash']}%
+"""
+        if allocation["total_value"] > 0:
+            moves = [f"- {'Buy' if amount > 0 else 'Sell'} {sleeve}: ${abs(amount):,.2f}"
+                     for sleeve, amount in allocation["trades"].items() if abs(amount) >= 0.01]
+            if moves:
+                text += "\nTo rebalance:\n" + "\n".join(moves) + "\n"
+        return text
+    
+    @staticmethod
+    def shard_query(first_id: int, last_id: int):
+        return (
+            select(User.id, User.risk_profile, func.date_part("year", func.age(User.birth_date)).label("age"),
+                   Investment.asset_type, func.coalesce(func.sum(Investment.current_value), 0))
+            .select_from(User)
+            .outerjoin(Investment, Investment.user_id == User.id)
+            .where(User.id.between(first_id, last_id))
+            .group_by(User.id, User.risk_profile, User.birth_date, Investment.asset_type)
+        )
+    
+    def plan_rows(self, rows: List, method: str) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        user_ids = np.array([row[0] for row in rows])
+        users, first, inverse = np.unique(user_ids, return_index=True, return_inverse=True)
+        profiles = np.array([PROFILES.index(getattr(rows[i][1], "value", rows[i][1]) or "moderate") for i in first])
+        raw_ages = np.array([rows[i][2] if rows[i][2] is not None else np.nan for i in first], dtype=float)
+        assumed = np.isnan(raw_ages)
+        ages = np.where(assumed, settings.ALLOCATION_DEFAULT_AGE, raw_ages).astype(int)
+        
+        held = np.array([row[3] is not None for row in rows])
+        sleeves = np.array([ASSET_SLEEVES[getattr(row[3], "value", row[3])] if row[3] is not None else 0 for row in rows])
+        values = np.array([float(row[4]) for row in rows])
+        current = np.zeros((len(users), len(SLEEVES)))
+        np.add.at(current, (inverse[held], sleeves[held]), values[held])
+        
+        targets = self.targets(profiles, ages, method)
+        plan = self.rebalance(current, targets)
+        table = self.target_table(method)
+        due = np.flatnonzero((plan["totals"] > 0) & (plan["drift"] > settings.RECOMMENDATION_DRIFT_THRESHOLD))
+        
+        recommendations = []
+        for row in due:
+            profile = PROFILES[profiles[row]]
+            allocation = self._allocation(profile, int(ages[row]), bool(assumed[row]), method, targets[row], plan, row,
+                                          table["mu"], table["cov"])
+            recommendations.append({
+                "user_id": int(users[row]),
+                "title": f"Allocation - {profile.title()}",
+                "recommendation_text": self.recommendation_text(profile, allocation),
+                "suggested_allocation": allocation
+            })
+        return recommendations
+    
+    def regenerate_shard(self, conn: Connection, first_id: int, last_id: int, method: str) -> Dict[str, Any]:
+        began = time.perf_counter()
+        rows = conn.execute(self.shard_query(first_id, last_id)).all()
+        recommendations = self.plan_rows(rows, method)
+        if recommendations:
+            stmt = insert(Recommendation)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                index_where=text("source = 'system'"),
+                set_={column: getattr(stmt.excluded, column)
+                      for column in ("title", "recommendation_text", "suggested_allocation", "created_at")}
+            ), [{**recommendation, "source": "system", "created_at": datetime.utcnow()} for recommendation in recommendations])
+        return {"first_id": first_id, "last_id": last_id, "users": len({row[0] for row in rows}),
+                "written": len(recommendations), "seconds": round(time.perf_counter() - began, 3)}
+
+allocation_service = AllocationService(risk_service)
\ No newline at end of file
@@ -1,17 +1,21 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from .cache import LRUCache
 from .config import settings
-from .database import get_db
+from .database import get_db, get_async_db
 from .models import User
-from .schemas import TokenData
+from .password_pool import pwd_context
+from .schemas import TokenData, Principal, UserResponse
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+oauth2_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+principal_cache = LRUCache(maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -42,19 +46,64 @@ def verify_token(token: str, credentials_exception) -> TokenData:
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, user_id=payload.get("uid"))
         return token_data
     except JWTError:
         raise credentials_exception
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def _cached_principal(email: str, db: AsyncSession) -> Optional[Principal]:
+    # Only the immutable email -> id mapping is cached; profile fields change on PUT /me and are always read fresh
+    principal = principal_cache.get(email)
+    if principal is None:
+        row = (await db.execute(select(User.id, User.email).where(User.email == email))).first()
+        if row is None:
+            return None
+        principal = Principal(id=row.id, email=row.email)
+        principal_cache.set(email, principal)
+    return principal
+
+async def get_current_principal(request: Request, token: str = Depends(oauth2_scheme),
+                                db: AsyncSession = Depends(get_async_db)) -> Principal:
+    credentials_exception = _credentials_exception()
+    token_data = verify_token(token, credentials_exception)
+    if token_data.user_id is not None:
+        principal = Principal(id=token_data.user_id, email=token_data.email)
+    else:
+        principal = await _cached_principal(token_data.email, db)
+        if principal is None:
+            raise credentials_exception
+    request.state.user_id = principal.id
+    return principal
+
+async def get_stream_principal(request: Request, token: Optional[str] = Query(None),
+                               bearer: Optional[str] = Depends(oauth2_optional),
+                               db: AsyncSession = Depends(get_async_db)) -> Principal:
+    # EventSource cannot set headers, so streaming endpoints also accept ?token=
+    try:
+        return await get_current_principal(request, token=bearer or token or "", db=db)
+    finally:
+        # Long-lived streams must not pin a pooled connection
+        await db.close()
+
+async def get_current_profile(request: Request, token: str = Depends(oauth2_scheme),
+                              db: AsyncSession = Depends(get_async_db)) -> UserResponse:
+    credentials_exception = _credentials_exception()
     token_data = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = (await db.execute(select(User).where(User.email == token_data.email))).scalars().first()
     if user is None:
         raise credentials_exception
+    request.state.user_id = user.id
+    return UserResponse.model_validate(user)
+
+def get_current_user(principal: Principal = Depends(get_current_principal), db: Session = Depends(get_db)) -> User:
+    user = db.get(User, principal.id)
+    if user is None:
+        raise _credentials_exception()
     return user
\ No newline at end of file
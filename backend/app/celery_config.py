@@ -1,10 +1,31 @@
-from celery import Celery
+import json
+import logging
+import os
+import time
+import redis
+from celery import Celery, chord, group
 from celery.schedules import crontab
+from celery.signals import task_postrun, task_prerun, worker_process_init, worker_ready
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .models import Investment
+
+os.environ.setdefault("DB_POOL_PROFILE", "celery")
+
+from .allocation_service import allocation_service
+from .config import settings
+from .database import SessionLocal, engine
+from .import_service import import_service
+from .metrics import observe_task, registry
 from .market_service import market_service
-from datetime import datetime
+from .models import User
+from .portfolio_service import portfolio_service
+from .projection_cache import projection_cache
+from .quote_cache import quote_cache
+from .valuation_service import valuation_service
+
+logger = logging.getLogger(__name__)
 
 celery_app = Celery('wealth_tracker', broker='redis://localhost:6379/0', backend='redis://localhost:6379/0')
 
@@ -16,40 +37,241 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
-@celery_app.task(name='refresh_all_prices_midnight')
-def refresh_all_investment_prices_midnight():
+@worker_process_init.connect
+def _reset_pool(**kwargs):
+    # Connections inherited from the parent across fork must not be reused by the child
+    engine.dispose(close=False)
+
+_task_started = {}
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    began = _task_started.pop(task_id, None)
+    if began is not None:
+        observe_task(task.name, state or "UNKNOWN", time.perf_counter() - began)
+
+@worker_ready.connect
+def _serve_metrics(**kwargs):
+    if not settings.CELERY_METRICS_PORT:
+        return
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        # Tasks run in prefork children, so without a shared multiprocess dir this server would only
+        # ever expose the parent's empty registry
+        raise RuntimeError("CELERY_METRICS_PORT requires PROMETHEUS_MULTIPROC_DIR to be set for the worker")
+    from prometheus_client import start_http_server
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry())
+
+def _refresh_state() -> redis.Redis:
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+def _refresh_plan(state: redis.Redis, run_id: str) -> List[List[str]]:
+    key = f"refresh:{run_id}:plan"
+    plan = state.get(key)
+    if plan:
+        return json.loads(plan)
+    
     db: Session = SessionLocal()
     try:
-        print("🌙 Midnight price refresh started...")
-        investments = db.query(Investment).all()
-        symbols = list(set([inv.symbol for inv in investments]))
+        symbols = valuation_service.distinct_symbols(db)
+    finally:
+        db.close()
+    size = settings.REFRESH_SHARD_SIZE
+    shards = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+    if not state.set(key, json.dumps(shards), nx=True, ex=settings.REFRESH_STATE_TTL_SECONDS):
+        return json.loads(state.get(key))
+    return shards
+
+@celery_app.task(name='refresh_all_prices_midnight')
+def refresh_all_investment_prices_midnight(run_id: Optional[str] = None):
+    try:
+        run_id = run_id or datetime.utcnow().strftime("%Y-%m-%d")
+        logger.info("🌙 Midnight price refresh %s started...", run_id)
+        state = _refresh_state()
+        shards = _refresh_plan(state, run_id)
         
-        if not symbols:
+        if not shards:
             return {"message": "No investments", "updated": 0}
         
-        prices = market_service.get_multiple_prices(symbols)
-        updated_count = 0
+        done = state.hkeys(f"refresh:{run_id}:done")
+        pending = [refresh_price_shard.s(run_id, index, shard) for index, shard in enumerate(shards) if str(index) not in done]
+        if not pending:
+            return aggregate_price_refresh([], run_id, len(shards))
         
-        for investment in investments:
-            price_data = prices.get(investment.symbol)
-            if price_data and price_data.get('price'):
-                investment.last_price = price_data['price']
-                investment.current_value = float(investment.units) * float(price_data['price'])
-                investment.last_price_at = datetime.utcnow()
-                updated_count += 1
+        chord(group(pending))(aggregate_price_refresh.s(run_id, len(shards)))
+        logger.info("   dispatched %d of %d shards", len(pending), len(shards))
+        return {"message": f"Dispatched {len(pending)} shards", "run_id": run_id, "shards": len(shards),
+                "dispatched": len(pending)}
+    except Exception as e:
+        logger.exception("❌ Error: %s", e)
+        return {"error": str(e)}
+
+@celery_app.task(name='refresh_price_shard', bind=True, max_retries=3, acks_late=True)
+def refresh_price_shard(self, run_id: str, index: int, symbols: List[str]):
+    state = _refresh_state()
+    done_key = f"refresh:{run_id}:done"
+    completed = state.hget(done_key, index)
+    if completed:
+        return json.loads(completed)
+    
+    began = time.perf_counter()
+    try:
+        fetched = market_service.fetch_prices(symbols)
+        prices = fetched["prices"]
+        quote_cache.store(prices)
+        result = valuation_service.apply_prices(prices)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+        # Report the shard as failed instead of raising, otherwise the chord callback and the day's snapshots never run
+        summary = {"shard": index, "symbols": len(symbols), "updated": 0, "failed": len(symbols),
+                   "error": f"{type(e).__name__}: {e}", "seconds": round(time.perf_counter() - began, 3)}
+        failed_key = f"refresh:{run_id}:failed"
+        state.hset(failed_key, index, json.dumps(summary))
+        state.expire(failed_key, settings.REFRESH_STATE_TTL_SECONDS)
+        logger.error("   shard %s failed after %d retries: %s", index, self.request.retries, e)
+        return summary
+    
+    summary = {"shard": index, "symbols": len(symbols), "updated": result["updated"],
+               "failed": len(fetched["errors"]), "seconds": round(time.perf_counter() - began, 3)}
+    state.hset(done_key, index, json.dumps(summary))
+    state.expire(done_key, settings.REFRESH_STATE_TTL_SECONDS)
+    logger.info("   shard %s: %d investments in %ss", index, summary["updated"], summary["seconds"])
+    return summary
+
+@celery_app.task(name='aggregate_price_refresh')
+def aggregate_price_refresh(results: list, run_id: str, shard_count: int):
+    state = _refresh_state()
+    summaries = [json.loads(value) for value in state.hvals(f"refresh:{run_id}:done")]
+    failed_shards = [json.loads(value) for key, value in state.hgetall(f"refresh:{run_id}:failed").items()
+                     if not state.hexists(f"refresh:{run_id}:done", key)]
+    updated = sum(summary["updated"] for summary in summaries)
+    failed = sum(summary["failed"] for summary in summaries + failed_shards)
+    # Positions in failed shards keep their previous price; every other position is snapshotted at today's value
+    with engine.begin() as conn:
+        snapshots = portfolio_service.write_snapshots(conn)
+    projection_cache.invalidate_all()
+    logger.info("✅ Midnight update %s complete: %d investments across %d/%d shards", run_id, updated, len(summaries), shard_count)
+    return {"message": f"Updated {updated} investments", "run_id": run_id, "updated": updated, "failed": failed,
+            "shards": shard_count, "completed_shards": len(summaries), "failed_shards": len(failed_shards),
+            "snapshots": snapshots}
+
+@celery_app.task(name='regenerate_recommendations')
+def regenerate_recommendations(run_id: Optional[str] = None, method: str = "mean_variance"):
+    try:
+        run_id = run_id or datetime.utcnow().strftime("%Y-%m-%d")
+        logger.info("🧭 Recommendation run %s started...", run_id)
+        with engine.connect() as conn:
+            first_id, last_id = conn.execute(select(func.min(User.id), func.max(User.id))).one()
+        if first_id is None:
+            return {"message": "No users", "written": 0}
         
-        db.commit()
-        print(f"✅ Midnight update complete: {updated_count} investments")
-        return {"message": f"Updated {updated_count} investments", "updated": updated_count}
+        # Shards are id ranges so that every worker aggregates its users with one indexed query
+        size = settings.RECOMMENDATION_SHARD_USERS
+        shards = [(start, min(start + size - 1, last_id)) for start in range(first_id, last_id + 1, size)]
+        done = _refresh_state().hkeys(f"recommend:{run_id}:done")
+        pending = [regenerate_recommendation_shard.s(run_id, start, end, method)
+                   for start, end in shards if str(start) not in done]
+        if not pending:
+            return aggregate_recommendations([], run_id, len(shards))
+        
+        chord(group(pending))(aggregate_recommendations.s(run_id, len(shards)))
+        logger.info("   dispatched %d of %d shards", len(pending), len(shards))
+        return {"message": f"Dispatched {len(pending)} shards", "run_id": run_id, "shards": len(shards),
+                "dispatched": len(pending)}
     except Exception as e:
-        print(f"❌ Error: {e}")
+        logger.exception("❌ Error: %s", e)
         return {"error": str(e)}
+
+@celery_app.task(name='regenerate_recommendation_shard', autoretry_for=(Exception,), retry_backoff=True, max_retries=3, acks_late=True)
+def regenerate_recommendation_shard(run_id: str, first_id: int, last_id: int, method: str):
+    state = _refresh_state()
+    done_key = f"recommend:{run_id}:done"
+    completed = state.hget(done_key, first_id)
+    if completed:
+        return json.loads(completed)
+    
+    with engine.begin() as conn:
+        summary = allocation_service.regenerate_shard(conn, first_id, last_id, method)
+    state.hset(done_key, first_id, json.dumps(summary))
+    state.expire(done_key, settings.REFRESH_STATE_TTL_SECONDS)
+    logger.info("   users %d-%d: %d of %d in %ss", first_id, last_id, summary["written"], summary["users"], summary["seconds"])
+    return summary
+
+@celery_app.task(name='aggregate_recommendations')
+def aggregate_recommendations(results: list, run_id: str, shard_count: int):
+    summaries = [json.loads(value) for value in _refresh_state().hvals(f"recommend:{run_id}:done")]
+    users = sum(summary["users"] for summary in summaries)
+    written = sum(summary["written"] for summary in summaries)
+    logger.info("✅ Recommendation run %s complete: %d of %d users across %d/%d shards", run_id, written, users, len(summaries), shard_count)
+    return {"message": f"Wrote {written} recommendations", "run_id": run_id, "users": users, "written": written,
+            "shards": shard_count, "completed_shards": len(summaries)}
+
+@celery_app.task(name='run_import', acks_late=True)
+def run_import(job_id: str):
+    job = import_service.get_job(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        return job
+    if not import_service.claim(job_id):
+        # Another worker still holds a live heartbeat on this job
+        return job
+    # A "running" job whose lease we could take was abandoned by a crashed worker; chunks are
+    # committed as they go, so it resumes after the last committed line instead of replaying
+    resume = job if job["status"] == "running" else None
+    job = import_service.save_job({**job, "status": "running", "attempts": job.get("attempts", 0) + 1})
+    if job["attempts"] > settings.IMPORT_MAX_ATTEMPTS:
+        job = import_service.save_job({**job, "status": "failed",
+                                       "error": f"Gave up after {settings.IMPORT_MAX_ATTEMPTS} attempts"})
+        import_service.remove_spool(job)
+        import_service.release(job_id)
+        logger.error("❌ Import %s abandoned after %d attempts", job_id, settings.IMPORT_MAX_ATTEMPTS)
+        return job
+    
+    def progress(report):
+        import_service.save_job({**job, **report})
+        import_service.heartbeat(job_id)
+    
+    db: Session = SessionLocal()
+    try:
+        with open(job["spool_path"], "rb") as stream:
+            report = import_service.run(db, job["user_id"], job["kind"], stream, job["format"],
+                                        progress=progress, resume=resume)
+        job = import_service.save_job({**job, **report, "status": "completed"})
+        logger.info("✅ Import %s: %d %s inserted, %d failed", job_id, report["inserted"], report["kind"], report["failed"])
+    except Exception as e:
+        db.rollback()
+        job = import_service.save_job({**job, "status": "failed", "error": f"{type(e).__name__}: {e}"})
+        logger.exception("❌ Import %s failed: %s", job_id, e)
     finally:
         db.close()
+    import_service.remove_spool(job)
+    import_service.release(job_id)
+    return job
+
+@celery_app.task(name='resume_stale_imports')
+def resume_stale_imports():
+    """Re-dispatch imports whose worker died mid-run so they resume (or fail) instead of staying "running"."""
+    job_ids = [job["id"] for job in import_service.stale_jobs()]
+    for job_id in job_ids:
+        run_import.delay(job_id)
+    if job_ids:
+        logger.warning("♻️ Resuming %d stale imports", len(job_ids))
+    return job_ids
 
 celery_app.conf.beat_schedule = {
     'refresh-prices-at-midnight': {
         'task': 'refresh_all_prices_midnight',
         'schedule': crontab(hour=0, minute=0),
     },
+    'regenerate-recommendations': {
+        'task': 'regenerate_recommendations',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'resume-stale-imports': {
+        'task': 'resume_stale_imports',
+        'schedule': crontab(minute='*/5'),
+    },
 }
\ No newline at end of file
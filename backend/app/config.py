@@ -1,14 +1,100 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_STICKY_SECONDS: float = 10.0
+    REPLICA_STICKY_MAX_USERS: int = 50000
+    REPLICA_STICKY_USE_REDIS: bool = True
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    DB_ASYNC_MODE: str = "native"
+    DB_POOL_PROFILE: str = "api"
+    DB_POOL_PROFILES: Dict[str, Dict[str, Any]] = {
+        "api": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+        "celery": {"pool_size": 2, "max_overflow": 4, "pool_timeout": 30, "pool_recycle": 1800, "pool_pre_ping": True}
+    }
+    DB_PGBOUNCER: bool = False
     REDIS_URL: str = "redis://localhost:6379/0"
     ALPHA_VANTAGE_API_KEY: Optional[str] = None
+    MARKET_PROVIDERS: List[str] = ["yfinance", "alphavantage"]
+    MARKET_REPLAY_PATH: Optional[str] = None
+    MARKET_BATCH_SIZE: int = 50
+    MARKET_MAX_WORKERS: int = 8
+    MARKET_PROVIDER_CONCURRENCY: int = 4
+    MARKET_MAX_RETRIES: int = 3
+    MARKET_RETRY_BACKOFF_SECONDS: float = 0.5
+    QUOTE_CACHE_MAX_ENTRIES: int = 10000
+    QUOTE_CACHE_DEFAULT_TTL_SECONDS: int = 60
+    QUOTE_CACHE_TTL_SECONDS: Dict[str, int] = {"stock": 60, "etf": 60, "mutual_fund": 3600, "bond": 900, "cash": 86400}
+    QUOTE_CACHE_STALE_SECONDS: int = 300
+    QUOTE_CACHE_USE_REDIS: bool = False
+    CURRENCY_LOOKUP_RETRY_SECONDS: int = 3600
+    PRICE_STREAM_POLL_SECONDS: float = 5.0
+    PRICE_STREAM_SUBSCRIPTION_TTL_SECONDS: int = 30
+    PRICE_STREAM_KEEPALIVE_SECONDS: int = 15
+    PRICE_STREAM_QUEUE_SIZE: int = 100
+    PRICE_STREAM_POSITIONS_TTL_SECONDS: int = 60
+    HISTORY_STORE_DIR: str = "data/history"
+    HISTORY_INITIAL_PERIOD: str = "10y"
+    HISTORY_REFRESH_SECONDS: int = 3600
+    HISTORY_MAX_OPEN_FILES: int = 256
+    RISK_LOOKBACK_DAYS: int = 365
+    RISK_CONFIDENCE: float = 0.95
+    RISK_BENCHMARK_SYMBOL: str = "SPY"
+    RISK_MIN_OBSERVATIONS: int = 30
+    RISK_MIN_COVERAGE: float = 0.8
+    RISK_CACHE_MAX_ENTRIES: int = 10000
+    ALLOCATION_PROXIES: Dict[str, str] = {"stocks": "SPY", "bonds": "AGG"}
+    ALLOCATION_LOOKBACK_DAYS: int = 1827
+    ALLOCATION_PRIOR_RETURNS: Dict[str, float] = {"stocks": 0.07, "bonds": 0.035, "cash": 0.03}
+    ALLOCATION_PRIOR_VOLATILITY: Dict[str, float] = {"stocks": 0.16, "bonds": 0.06}
+    ALLOCATION_RETURN_SHRINKAGE: float = 0.5
+    ALLOCATION_RISK_AVERSION: Dict[str, float] = {"conservative": 8.0, "moderate": 4.0, "aggressive": 2.0}
+    ALLOCATION_CASH_RESERVE: Dict[str, float] = {"conservative": 0.10, "moderate": 0.05, "aggressive": 0.02}
+    ALLOCATION_DEFAULT_AGE: int = 35
+    ALLOCATION_GRID_STEP: float = 0.01
+    RECOMMENDATION_DRIFT_THRESHOLD: float = 0.05
+    RECOMMENDATION_SHARD_USERS: int = 20000
+    VALUATION_CHUNK_SIZE: int = 500
+    REFRESH_SHARD_SIZE: int = 1000
+    REFRESH_STATE_TTL_SECONDS: int = 172800
+    MONTE_CARLO_DEFAULT_PATHS: int = 10000
+    MONTE_CARLO_MAX_PATHS: int = 100000
+    MONTE_CARLO_CHUNK_PATHS: int = 10000
+    MONTE_CARLO_DEFAULT_VOLATILITY: float = 0.15
+    SWEEP_MAX_POINTS: int = 100000
+    PROJECTION_CACHE_MAX_ENTRIES: int = 10000
+    PROJECTION_CACHE_TTL_SECONDS: int = 300
+    PROJECTION_CACHE_USE_REDIS: bool = True
+    LEDGER_MAX_BATCH: int = 50000
+    IMPORT_CHUNK_SIZE: int = 1000
+    IMPORT_MAX_ERRORS: int = 1000
+    IMPORT_INLINE_MAX_BYTES: int = 5 * 1024 * 1024
+    # Uploads are spooled here by the API and read back by the Celery worker, so this must be
+    # an absolute path on storage mounted at the same location on every API and worker host
+    IMPORT_SPOOL_DIR: str = "/var/lib/wealth-tracker/imports"
+    IMPORT_JOB_TTL_SECONDS: int = 86400
+    IMPORT_STALE_SECONDS: int = 300
+    IMPORT_MAX_ATTEMPTS: int = 3
+    EXPORT_BATCH_SIZE: int = 5000
+    EXPORT_GZIP_LEVEL: int = 6
+    PAGE_DEFAULT_LIMIT: int = 100
+    PAGE_MAX_LIMIT: int = 1000
+    STREAM_BATCH_SIZE: int = 500
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 50000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    LOG_LEVEL: str = "INFO"
+    SLOW_REQUEST_SECONDS: float = 1.0
+    SLOW_REQUEST_MAX_STATEMENTS: int = 50
+    # 0 disables the worker's metrics endpoint; give each worker on a host its own port
+    CELERY_METRICS_PORT: int = 0
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_POOL_MAX_PENDING: int = 64
     
     class Config:
         env_file = ".env"
@@ -1,15 +1,267 @@
-from sqlalchemy import create_engine
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from .cache import LRUCache
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(hide_password=False)
+
+class PoolTelemetry:
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._telemetry_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._telemetry_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_seconds_total += elapsed
+                self.wait_seconds_max = max(self.wait_seconds_max, elapsed)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._telemetry_lock:
+            checkouts, timeouts = self.checkouts, self.timeouts
+            total, peak = self.wait_seconds_total, self.wait_seconds_max
+        return {
+            "pool": type(self).__name__,
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_seconds_avg": round(total / checkouts, 6) if checkouts else 0,
+            "wait_seconds_max": round(peak, 6)
+        }
+
+class InstrumentedQueuePool(PoolTelemetry, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(PoolTelemetry, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options(url: str, asynchronous: bool = False) -> Dict[str, Any]:
+    if settings.DB_PGBOUNCER:
+        options: Dict[str, Any] = {"poolclass": NullPool}
+        if asynchronous and make_url(url).get_backend_name() == "postgresql":
+            # PgBouncer in transaction mode cannot keep asyncpg's named prepared statements
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+            }
+        return options
+    
+    profile = settings.DB_POOL_PROFILES.get(settings.DB_POOL_PROFILE)
+    if profile is None:
+        raise ValueError(f"Unknown DB_POOL_PROFILE {settings.DB_POOL_PROFILE!r}")
+    return {**profile, "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool}
+
+def pool_stats(bind: Engine) -> Dict[str, Any]:
+    pool = bind.pool
+    if isinstance(pool, PoolTelemetry):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+replica_engines = [create_engine(url, **engine_options(url)) for url in settings.DATABASE_REPLICA_URLS]
+recent_writes = LRUCache(maxsize=settings.REPLICA_STICKY_MAX_USERS, ttl=settings.REPLICA_STICKY_SECONDS)
+_sticky_redis = None
+
+def _sticky_client():
+    global _sticky_redis
+    if not settings.REPLICA_STICKY_USE_REDIS:
+        return None
+    if _sticky_redis is None:
+        import redis
+        _sticky_redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _sticky_redis
+
+def mark_write(user_id: Optional[int]) -> None:
+    if user_id is None:
+        return
+    recent_writes.set(user_id, time.time())
+    # The marker is shared so that a read served by another worker or host also goes to the primary
+    client = _sticky_client()
+    if client is not None and replica_engines:
+        try:
+            client.set(f"replica:wrote:{user_id}", 1, px=int(settings.REPLICA_STICKY_SECONDS * 1000))
+        except Exception as e:
+            logger.warning("Could not record write marker for user %s: %s", user_id, e)
+
+def reads_pinned(user_id: Optional[int]) -> bool:
+    if user_id is None:
+        return False
+    if recent_writes.get(user_id) is not None:
+        return True
+    client = _sticky_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(f"replica:wrote:{user_id}"))
+    except Exception as e:
+        logger.warning("Could not read write marker for user %s, reading from the primary: %s", user_id, e)
+        return True
+
+def _request_user(session: Session) -> Optional[int]:
+    return getattr(session.info.get("request_state"), "user_id", None)
+
+class RoutingSession(Session):
+    primary: Engine = engine
+    replicas: List[Engine] = replica_engines
+    
+    def _pinned(self) -> bool:
+        # Checked once per session so a request pays at most one Redis round trip
+        if "pinned" not in self.info:
+            self.info["pinned"] = reads_pinned(_request_user(self))
+        return self.info["pinned"]
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        if bind is not None:
+            return bind
+        if (self.info.get("read_only") and self.replicas and not self._flushing
+                and not isinstance(clause, UpdateBase) and not self._pinned()):
+            index = self.info.setdefault("replica", random.randrange(len(self.replicas)))
+            return self.replicas[index]
+        return self.primary
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _track_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_write(session):
+    if session.info.pop("wrote", False):
+        session.info["pinned"] = True
+        mark_write(_request_user(session))
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_write(session):
+    session.info.pop("wrote", None)
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+async_engine = None
+async_replica_engines = []
+AsyncSessionLocal = None
+if settings.DB_ASYNC_MODE == "native":
+    async_url = async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(async_url, **engine_options(async_url, asynchronous=True))
+    async_replica_engines = [create_async_engine(url, **engine_options(url, asynchronous=True))
+                             for url in map(async_database_url, settings.DATABASE_REPLICA_URLS)]
+    
+    class AsyncRoutingSession(RoutingSession):
+        primary = async_engine.sync_engine
+        replicas = [replica.sync_engine for replica in async_replica_engines]
+    
+    AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=AsyncRoutingSession,
+                                           autoflush=False, expire_on_commit=False)
+
+class ThreadpoolSession:
+    
+    def __init__(self, session):
+        self.sync_session = session
+    
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+    
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+    
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+    
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+    
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+    
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+    
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+    
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+    
+    async def refresh(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+    
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+def _session_info(request: Request, read_only: bool) -> Dict[str, Any]:
+    return {"request_state": request.state, "read_only": read_only}
+
+def _async_session(info: Dict[str, Any]):
+    if AsyncSessionLocal is not None:
+        return AsyncSessionLocal(info=info)
+    return ThreadpoolSession(SessionLocal(info=info))
+
+def get_db(request: Request):
+    db = SessionLocal(info=_session_info(request, read_only=False))
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    db = SessionLocal(info=_session_info(request, read_only=True))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db(request: Request):
+    db = _async_session(_session_info(request, read_only=False))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def get_async_read_db(request: Request):
+    db = _async_session(_session_info(request, read_only=True))
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
\ No newline at end of file
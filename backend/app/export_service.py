@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from typing import Any, Iterator, List, Optional, Sequence
+from sqlalchemy import Date, DateTime, Integer, Numeric, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import Investment, Simulation, Transaction
+from .pagination import json_default, select_columns
+
+EXPORTS = {
+    "investments": (Investment, None),
+    "transactions": (Transaction, Transaction.executed_at),
+    "simulations": (Simulation, Simulation.created_at)
+}
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=json_default)
+    return value
+
+class ExportService:
+    
+    @staticmethod
+    def query(dataset: str, user_id: int, start: Optional[date], end: Optional[date], fields: Optional[str]):
+        model, date_column = EXPORTS[dataset]
+        columns = select_columns(model, fields)
+        stmt = select(*columns).where(model.user_id == user_id)
+        if date_column is not None and start:
+            stmt = stmt.where(date_column >= datetime.combine(start, time.min))
+        if date_column is not None and end:
+            stmt = stmt.where(date_column < datetime.combine(end + timedelta(days=1), time.min))
+        # Ordering by the filtered date column lets Postgres walk the per-user date index instead of sorting
+        order = [model.id] if date_column is None else [date_column, model.id]
+        return stmt.order_by(*order), columns
+    
+    @staticmethod
+    def batches(db: Session, stmt) -> Iterator[Sequence]:
+        # yield_per opens a server-side cursor, so only one batch of rows is held at a time
+        result = db.execute(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+    
+    @staticmethod
+    def csv_chunks(batches: Iterator[Sequence], columns: List) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.key for column in columns])
+        for rows in batches:
+            writer.writerows([_cell(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    
+    @staticmethod
+    def ndjson_chunks(batches: Iterator[Sequence], columns: List) -> Iterator[bytes]:
+        keys = [column.key for column in columns]
+        for rows in batches:
+            yield "".join(json.dumps(dict(zip(keys, row)), default=json_default) + "\n" for row in rows).encode()
+    
+    @staticmethod
+    def arrow_type(pa, column):
+        if isinstance(column.type, Numeric):
+            return pa.decimal128(column.type.precision or 38, column.type.scale or 0)
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column.type, Date):
+            return pa.date32()
+        return pa.string()
+    
+    @staticmethod
+    def parquet_chunks(batches: Iterator[Sequence], columns: List) -> Iterator[bytes]:
+        # Imported here rather than inside the generator so a missing pyarrow fails before the response starts
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        schema = pa.schema([pa.field(column.key, ExportService.arrow_type(pa, column)) for column in columns])
+        return ExportService._row_groups(pa, pq, schema, batches)
+    
+    @staticmethod
+    def _row_groups(pa, pq, schema, batches: Iterator[Sequence]) -> Iterator[bytes]:
+        textual = [field.type == pa.string() for field in schema]
+        sink = io.BytesIO()
+        writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        # Every batch becomes its own row group, which is flushed to the client as soon as it is written
+        for rows in batches:
+            arrays = [pa.array([_cell(row[i]) if textual[i] else row[i] for row in rows], type=field.type)
+                      for i, field in enumerate(schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        writer.close()
+        yield sink.getvalue()
+    
+    @staticmethod
+    def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(settings.EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    
+    def stream(self, db: Session, dataset: str, user_id: int, format: str, start: Optional[date] = None,
+               end: Optional[date] = None, fields: Optional[str] = None, gzip: bool = True) -> Iterator[bytes]:
+        stmt, columns = self.query(dataset, user_id, start, end, fields)
+        encode = {"csv": self.csv_chunks, "ndjson": self.ndjson_chunks, "parquet": self.parquet_chunks}[format]
+        chunks = encode(self.batches(db, stmt), columns)
+        return self.gzip_chunks(chunks) if gzip and format != "parquet" else chunks
+
+export_service = ExportService()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import logging
+import os
+import re
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from .cache import LRUCache
+from .config import settings
+from .market_providers import period_start
+from .market_service import MarketDataService, market_service
+
+logger = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "i8"),
+])
+COLUMNS = ("open", "high", "low", "close", "volume")
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9.^=\-]{1,20}$")
+
+class HistoryStore:
+    
+    def __init__(self, service: MarketDataService, root: str):
+        self.service = service
+        self.root = Path(root)
+        self._maps = LRUCache(maxsize=settings.HISTORY_MAX_OPEN_FILES)
+        self._checked = LRUCache(maxsize=settings.QUOTE_CACHE_MAX_ENTRIES, ttl=settings.HISTORY_REFRESH_SECONDS)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def validate_symbol(symbol: str) -> None:
+        if not SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"Invalid symbol {symbol!r}")
+    
+    def _path(self, symbol: str) -> Path:
+        self.validate_symbol(symbol)
+        return self.root / f"{symbol}.npy"
+    
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+    
+    def load(self, symbol: str) -> np.ndarray:
+        bars = self._maps.get(symbol)
+        if bars is None:
+            path = self._path(symbol)
+            bars = np.load(path, mmap_mode="r") if path.exists() else np.empty(0, dtype=BAR_DTYPE)
+            self._maps.set(symbol, bars)
+        return bars
+    
+    @staticmethod
+    def to_bars(frame) -> np.ndarray:
+        frame = frame.dropna(subset=["Close"])
+        index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+        bars = np.empty(len(frame), dtype=BAR_DTYPE)
+        bars["date"] = index.values.astype("datetime64[D]")
+        for column in COLUMNS[:-1]:
+            bars[column] = frame[column.capitalize()].to_numpy()
+        bars["volume"] = frame["Volume"].fillna(0).to_numpy()
+        return bars
+    
+    def _write(self, symbol: str, bars: np.ndarray) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(symbol)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, bars)
+        # Readers holding the old memory map keep the previous inode until they drop it
+        os.replace(tmp, path)
+        self._maps.pop(symbol)
+    
+    def update(self, symbol: str) -> int:
+        with self._symbol_lock(symbol):
+            stored = self.load(symbol)
+            last = stored["date"][-1] if len(stored) else None
+            start = (last + np.timedelta64(1, "D")).item() if last is not None else None
+            today = date.today()
+            if start is not None and start >= today:
+                self._checked.set(symbol, True)
+                return 0
+            
+            frame = self.service.fetch_bars(symbol, start=start)
+            fresh = self.to_bars(frame) if frame is not None and not frame.empty else np.empty(0, dtype=BAR_DTYPE)
+            # Today's bar is still forming and appends are never revisited, so only completed sessions are stored
+            fresh = fresh[fresh["date"] < np.datetime64(today, "D")]
+            if last is not None:
+                fresh = fresh[fresh["date"] > last]
+            if len(fresh):
+                self._write(symbol, np.concatenate([stored, fresh]))
+            self._checked.set(symbol, True)
+            return len(fresh)
+    
+    def ensure_fresh(self, symbol: str) -> None:
+        if self._checked.get(symbol) is not None:
+            return
+        try:
+            self.update(symbol)
+        except Exception as e:
+            logger.warning("History update failed for %s, serving stored bars: %s", symbol, e)
+    
+    def read(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        self.validate_symbol(symbol)
+        self.ensure_fresh(symbol)
+        bars = self.load(symbol)
+        dates = bars["date"]
+        lo = np.searchsorted(dates, np.datetime64(start, "D"), side="left") if start else 0
+        hi = np.searchsorted(dates, np.datetime64(end, "D"), side="right") if end else len(bars)
+        return bars[lo:hi]
+    
+    @staticmethod
+    def columns(bars: np.ndarray) -> Dict[str, List]:
+        return {"dates": np.datetime_as_string(bars["date"]).tolist(), **{column: bars[column].tolist() for column in COLUMNS}}
+
+history_store = HistoryStore(market_service, settings.HISTORY_STORE_DIR)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, DataError, IntegrityError
+from sqlalchemy.orm import Session
+from .config import settings
+from .ledger_service import ledger_service
+from .models import Investment, Transaction
+from .projection_cache import projection_cache
+from .schemas import InvestmentCreate, TransactionCreate
+
+IMPORT_SCHEMAS = {"investments": InvestmentCreate, "transactions": TransactionCreate}
+FORMAT_SUFFIXES = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+# Errors a single bad row can raise; a chunk failing with one of these is replayed row by row
+ROW_ERRORS = (ValueError, TypeError, IntegrityError, DataError)
+RESUME_FIELDS = ("processed", "inserted", "failed", "errors", "committed_line")
+
+class ImportService:
+    
+    def __init__(self):
+        self._redis = None
+    
+    @staticmethod
+    def parse(stream: BinaryIO, format: str) -> Iterator[Tuple[int, Any]]:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        try:
+            if format == "csv":
+                reader = csv.DictReader(text)
+                for row in reader:
+                    # Empty cells are dropped so that optional columns fall back to the schema defaults
+                    yield reader.line_num, {key.strip(): value.strip() for key, value in row.items()
+                                            if key and isinstance(value, str) and value.strip()}
+            else:
+                for number, line in enumerate(text, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield number, e
+        finally:
+            text.detach()
+    
+    @staticmethod
+    def validate(rows: Iterator[Tuple[int, Any]], schema) -> Iterator[Tuple[int, Optional[BaseModel], Optional[str]]]:
+        for line, raw in rows:
+            if isinstance(raw, json.JSONDecodeError):
+                yield line, None, f"Invalid JSON: {raw.msg}"
+            elif not isinstance(raw, dict):
+                yield line, None, "Expected an object"
+            else:
+                try:
+                    yield line, schema.model_validate(raw), None
+                except ValidationError as e:
+                    yield line, None, "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                                                for error in e.errors())
+    
+    @staticmethod
+    def _error(report: Dict, line: int, error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+    
+    @staticmethod
+    def investment_rows(user_id: int, investments: List[InvestmentCreate]) -> List[Dict]:
+        rows = []
+        for inv in investments:
+            cost_basis = float(inv.units) * float(inv.avg_buy_price)
+            rows.append({"user_id": user_id, "asset_type": inv.asset_type.value, "symbol": inv.symbol.upper(),
+                         "units": inv.units, "avg_buy_price": inv.avg_buy_price, "cost_basis": cost_basis,
+                         "current_value": cost_basis, "last_price": inv.avg_buy_price})
+        return rows
+    
+    @staticmethod
+    def _record_transactions(db: Session, user_id: int, transactions: List[TransactionCreate]) -> None:
+        ledger_service.update_positions(db, user_id, transactions)
+        db.execute(insert(Transaction), ledger_service.transaction_rows(user_id, transactions))
+    
+    @staticmethod
+    def _describe(error: Exception) -> str:
+        if isinstance(error, DBAPIError):
+            # The driver message is enough; the SQL statement and bound parameters are not echoed back
+            return str(error.orig).strip().splitlines()[0]
+        return str(error)
+    
+    def _insert(self, db: Session, user_id: int, kind: str, models: List[BaseModel]) -> None:
+        if kind == "investments":
+            db.execute(insert(Investment), self.investment_rows(user_id, models))
+        else:
+            self._record_transactions(db, user_id, models)
+    
+    def _flush(self, db: Session, user_id: int, kind: str, batch: List[Tuple[int, BaseModel]], report: Dict) -> None:
+        savepoint = db.begin_nested()
+        try:
+            self._insert(db, user_id, kind, [model for _, model in batch])
+            savepoint.commit()
+            report["inserted"] += len(batch)
+        except ROW_ERRORS:
+            savepoint.rollback()
+            # Only a chunk that fails is replayed row by row to find the offending lines
+            for line, model in batch:
+                savepoint = db.begin_nested()
+                try:
+                    self._insert(db, user_id, kind, [model])
+                    savepoint.commit()
+                    report["inserted"] += 1
+                except ROW_ERRORS as e:
+                    savepoint.rollback()
+                    self._error(report, line, self._describe(e))
+        db.commit()
+        report["committed_line"] = batch[-1][0]
+    
+    def run(self, db: Session, user_id: int, kind: str, stream: BinaryIO, format: str,
+            progress: Optional[Callable[[Dict], None]] = None, resume: Optional[Dict] = None) -> Dict[str, Any]:
+        report = {"kind": kind, "format": format, "processed": 0, "inserted": 0, "failed": 0, "errors": [],
+                  "committed_line": 0}
+        if resume:
+            # Counters are only persisted right after a commit, so they match the rows up to committed_line
+            report.update({field: resume[field] for field in RESUME_FIELDS if field in resume})
+        skip_to = report["committed_line"]
+        batch: List[Tuple[int, BaseModel]] = []
+        try:
+            for line, model, error in self.validate(self.parse(stream, format), IMPORT_SCHEMAS[kind]):
+                if line <= skip_to:
+                    continue
+                report["processed"] += 1
+                if error:
+                    self._error(report, line, error)
+                    continue
+                batch.append((line, model))
+                if len(batch) >= settings.IMPORT_CHUNK_SIZE:
+                    self._flush(db, user_id, kind, batch, report)
+                    batch = []
+                    if progress:
+                        progress(report)
+            if batch:
+                self._flush(db, user_id, kind, batch, report)
+                if progress:
+                    progress(report)
+        finally:
+            if report["inserted"]:
+                projection_cache.invalidate_user(user_id)
+        return report
+    
+    @staticmethod
+    def infer_format(filename: Optional[str]) -> Optional[str]:
+        return FORMAT_SUFFIXES.get(os.path.splitext(filename or "")[1].lower())
+    
+    @staticmethod
+    def spool_path(job_id: str, format: str) -> str:
+        if not os.path.isabs(settings.IMPORT_SPOOL_DIR):
+            raise RuntimeError("IMPORT_SPOOL_DIR must be an absolute path on storage shared with the Celery workers")
+        return os.path.join(settings.IMPORT_SPOOL_DIR, f"{job_id}.{format}")
+    
+    @staticmethod
+    def remove_spool(job: Dict[str, Any]) -> None:
+        path = job.get("spool_path")
+        if path and os.path.exists(path):
+            os.remove(path)
+    
+    def _redis_client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+    
+    def save_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job["updated_at"] = datetime.utcnow().isoformat()
+        self._redis_client().setex(f"import:{job['id']}", settings.IMPORT_JOB_TTL_SECONDS, json.dumps(job))
+        return job
+    
+    def create_job(self, user_id: int, kind: str, format: str, filename: Optional[str], size: Optional[int]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        return self.save_job({"id": job_id, "user_id": user_id, "kind": kind, "format": format,
+                              "filename": filename, "size": size, "spool_path": self.spool_path(job_id, format),
+                              "status": "queued", "attempts": 0, "processed": 0, "inserted": 0, "failed": 0,
+                              "errors": [], "committed_line": 0})
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._redis_client().get(f"import:{job_id}")
+        return json.loads(job) if job else None
+    
+    def claim(self, job_id: str) -> bool:
+        """Take the job's heartbeat lease; fails while another worker is still beating on it."""
+        return bool(self._redis_client().set(f"import:{job_id}:lease", "1", nx=True, ex=settings.IMPORT_STALE_SECONDS))
+    
+    def heartbeat(self, job_id: str) -> None:
+        self._redis_client().expire(f"import:{job_id}:lease", settings.IMPORT_STALE_SECONDS)
+    
+    def release(self, job_id: str) -> None:
+        self._redis_client().delete(f"import:{job_id}:lease")
+    
+    def stale_jobs(self) -> Iterator[Dict[str, Any]]:
+        """Running jobs whose worker stopped renewing the lease, i.e. crashed or was killed mid-import."""
+        client = self._redis_client()
+        for key in client.scan_iter(match="import:*", count=500):
+            if key.endswith(":lease"):
+                continue
+            job = client.get(key)
+            job = json.loads(job) if job else None
+            if job and job["status"] == "running" and not client.exists(f"import:{job['id']}:lease"):
+                yield job
+
+import_service = ImportService()
\ No newline at end of file
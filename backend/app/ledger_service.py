@@ -0,0 +1,232 @@
+import argparse
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import Investment, Transaction, TransactionType
+from .schemas import TransactionCreate
+
+UNITS_QUANTUM = Decimal("0.0001")
+MONEY_QUANTUM = Decimal("0.01")
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # executed_at is stored as a naive UTC timestamp; aware inputs are converted so batches can be ordered
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+class LedgerService:
+    
+    @staticmethod
+    def apply(units: Decimal, cost_basis: Decimal, txn_type: TransactionType, quantity: Decimal,
+              price: Decimal, fees: Decimal, symbol: str = "") -> Tuple[Decimal, Decimal]:
+        if txn_type == TransactionType.buy:
+            return units + quantity, cost_basis + quantity * price + fees
+        if txn_type == TransactionType.sell:
+            if quantity > units:
+                raise ValueError(f"Cannot sell {quantity} {symbol}: only {units} held")
+            remaining = units - quantity
+            return remaining, (cost_basis * remaining / units) if remaining else Decimal(0)
+        return units, cost_basis
+    
+    @staticmethod
+    def transaction_rows(user_id: int, transactions: List[TransactionCreate]) -> List[Dict]:
+        executed_at = datetime.utcnow()
+        return [
+            {
+                "user_id": user_id,
+                "symbol": txn.symbol.upper(),
+                "type": txn.type.value,
+                "quantity": txn.quantity,
+                "price": txn.price,
+                "fees": txn.fees or 0,
+                "executed_at": naive_utc(txn.executed_at) or executed_at
+            }
+            for txn in transactions
+        ]
+    
+    @staticmethod
+    def _sell(lots: List[Investment], quantity: Decimal, symbol: str) -> None:
+        held = sum((Decimal(lot.units or 0) for lot in lots), Decimal(0))
+        if quantity > held:
+            raise ValueError(f"Cannot sell {quantity} {symbol}: only {held} held")
+        # Sells draw down the oldest lots first (FIFO); each lot keeps its own row and cost basis
+        for lot in lots:
+            if not quantity:
+                break
+            units = Decimal(lot.units or 0)
+            sold = min(units, quantity)
+            if not sold:
+                continue
+            remaining, cost_basis = LedgerService.apply(units, Decimal(lot.cost_basis or 0), TransactionType.sell,
+                                                        sold, Decimal(0), Decimal(0), symbol)
+            LedgerService._set_lot(lot, remaining, cost_basis)
+            quantity -= sold
+    
+    @staticmethod
+    def _set_lot(lot: Investment, units: Decimal, cost_basis: Decimal, price: Optional[Decimal] = None) -> None:
+        lot.units = units
+        lot.cost_basis = cost_basis.quantize(MONEY_QUANTUM)
+        if units:
+            lot.avg_buy_price = (cost_basis / units).quantize(MONEY_QUANTUM)
+        lot.current_value = (units * Decimal(lot.last_price or price or 0)).quantize(MONEY_QUANTUM)
+    
+    @staticmethod
+    def update_positions(db: Session, user_id: int, transactions: List[TransactionCreate]) -> int:
+        symbols = {txn.symbol.upper() for txn in transactions}
+        lots: Dict[str, List[Investment]] = {}
+        for inv in (db.query(Investment)
+                    .filter(Investment.user_id == user_id, Investment.symbol.in_(symbols))
+                    .order_by(Investment.id)
+                    .with_for_update()):
+            lots.setdefault(inv.symbol, []).append(inv)
+        touched: Dict[int, Investment] = {}
+        
+        now = datetime.utcnow()
+        ordered = sorted(transactions, key=lambda txn: naive_utc(txn.executed_at) or now)
+        for txn in ordered:
+            symbol = txn.symbol.upper()
+            held = lots.get(symbol)
+            if txn.type == TransactionType.sell:
+                if not held:
+                    raise ValueError(f"Cannot sell {symbol}: no position held")
+                LedgerService._sell(held, Decimal(str(txn.quantity)), symbol)
+                touched.update((id(lot), lot) for lot in held)
+            elif txn.type == TransactionType.buy:
+                if not held:
+                    inv = Investment(user_id=user_id, asset_type=txn.asset_type, symbol=symbol, units=0,
+                                     avg_buy_price=0, cost_basis=0, current_value=0, last_price=txn.price)
+                    db.add(inv)
+                    held = lots[symbol] = [inv]
+                # Buys are added to the newest lot of the symbol
+                inv = held[-1]
+                units, cost_basis = LedgerService.apply(
+                    Decimal(inv.units or 0), Decimal(inv.cost_basis or 0), TransactionType.buy,
+                    Decimal(str(txn.quantity)), Decimal(str(txn.price)), Decimal(str(txn.fees or 0)), symbol)
+                LedgerService._set_lot(inv, units, cost_basis, Decimal(str(txn.price)))
+                touched[id(inv)] = inv
+        
+        # Only lots this batch sold out are removed; untouched lots are left as the user entered them
+        for inv in touched.values():
+            if not inv.units:
+                if inv.id is None:
+                    db.expunge(inv)
+                else:
+                    db.delete(inv)
+        return len(lots)
+    
+    @staticmethod
+    def _set_holding(lots: List[Investment], units: Decimal, cost_basis: Decimal) -> None:
+        held_units = sum((Decimal(lot.units or 0) for lot in lots), Decimal(0))
+        held_cost = sum((Decimal(lot.cost_basis or 0) for lot in lots), Decimal(0))
+        if not held_units:
+            # Nothing to scale from, so the whole holding lands on the newest lot
+            for lot in lots[:-1]:
+                LedgerService._set_lot(lot, Decimal(0), Decimal(0))
+            LedgerService._set_lot(lots[-1], units, cost_basis)
+            return
+        # Each lot is scaled in proportion so that lot rows survive and their totals match the ledger
+        for lot in lots:
+            lot_units = Decimal(lot.units or 0)
+            lot_cost = Decimal(lot.cost_basis or 0)
+            share = (lot_cost / held_cost) if held_cost else (lot_units / held_units)
+            LedgerService._set_lot(lot, (lot_units * units / held_units).quantize(UNITS_QUANTUM), cost_basis * share)
+    
+    @staticmethod
+    def _bytewise(db: Session, column):
+        # The merge below compares keys the way Python does, which only matches Postgres under the C collation
+        return column.collate("C") if db.get_bind().dialect.name == "postgresql" else column
+    
+    @staticmethod
+    def rebuild(db: Session, user_id: Optional[int] = None, apply: bool = False, batch_size: int = 5000) -> Dict:
+        ledger = select(Transaction.user_id, Transaction.symbol, Transaction.type, Transaction.quantity,
+                        Transaction.price, Transaction.fees)
+        held = select(Investment.user_id, Investment.symbol, func.sum(Investment.units).label("units"),
+                      func.sum(Investment.cost_basis).label("cost_basis"))
+        if user_id is not None:
+            ledger = ledger.where(Transaction.user_id == user_id)
+            held = held.where(Investment.user_id == user_id)
+        ledger = ledger.order_by(Transaction.user_id, LedgerService._bytewise(db, Transaction.symbol),
+                                 Transaction.executed_at, Transaction.id)
+        held = (held.group_by(Investment.user_id, Investment.symbol)
+                .order_by(Investment.user_id, LedgerService._bytewise(db, Investment.symbol)))
+        
+        ledger_rows = db.execute(ledger.execution_options(yield_per=batch_size))
+        held_rows = iter(db.execute(held.execution_options(yield_per=batch_size)))
+        position = next(held_rows, None)
+        
+        checked, mismatches, errors, untracked = 0, [], [], []
+        
+        def skip_to(key):
+            # Holdings that sort before the next ledger key have no transactions at all
+            nonlocal position
+            while position is not None and (key is None or (position.user_id, position.symbol) < key):
+                untracked.append({"user_id": position.user_id, "symbol": position.symbol,
+                                  "units": str(position.units), "cost_basis": str(position.cost_basis)})
+                position = next(held_rows, None)
+        
+        for key, entries in groupby(ledger_rows, key=lambda row: (row.user_id, row.symbol)):
+            uid, symbol = key
+            skip_to(key)
+            current = position if position is not None and (position.user_id, position.symbol) == key else None
+            if current is not None:
+                position = next(held_rows, None)
+            units, cost_basis = Decimal(0), Decimal(0)
+            try:
+                for entry in entries:
+                    units, cost_basis = LedgerService.apply(units, cost_basis, entry.type, entry.quantity,
+                                                            entry.price, entry.fees or Decimal(0), symbol)
+            except ValueError as e:
+                errors.append({"user_id": uid, "symbol": symbol, "error": str(e)})
+                continue
+            checked += 1
+            
+            held_units, held_cost = (current.units, current.cost_basis) if current else (Decimal(0), Decimal(0))
+            expected_cost = cost_basis.quantize(MONEY_QUANTUM)
+            if abs(held_units - units) >= UNITS_QUANTUM or abs(held_cost - expected_cost) >= MONEY_QUANTUM:
+                mismatches.append({"user_id": uid, "symbol": symbol, "units": str(held_units),
+                                   "expected_units": str(units), "cost_basis": str(held_cost),
+                                   "expected_cost_basis": str(expected_cost)})
+        skip_to(None)
+        
+        if apply and mismatches:
+            for mismatch in mismatches:
+                lots = (db.query(Investment)
+                        .filter(Investment.user_id == mismatch["user_id"], Investment.symbol == mismatch["symbol"])
+                        .order_by(Investment.id).all())
+                if lots:
+                    LedgerService._set_holding(lots, Decimal(mismatch["expected_units"]),
+                                               Decimal(mismatch["expected_cost_basis"]))
+            db.commit()
+        
+        # Untracked holdings were entered without transactions, so --apply has no ledger to rewrite them from
+        return {"checked": checked, "mismatches": mismatches, "errors": errors, "untracked": untracked, "applied": apply}
+
+ledger_service = LedgerService()
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    
+    parser = argparse.ArgumentParser(description="Replay the transaction ledger and verify positions")
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--apply", action="store_true", help="overwrite positions that do not match the ledger")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        report = LedgerService.rebuild(db, user_id=args.user_id, apply=args.apply, batch_size=args.batch_size)
+    finally:
+        db.close()
+    for mismatch in report["mismatches"]:
+        print(f"❌ user {mismatch['user_id']} {mismatch['symbol']}: units {mismatch['units']} != {mismatch['expected_units']}, "
+              f"cost {mismatch['cost_basis']} != {mismatch['expected_cost_basis']}")
+    for error in report["errors"]:
+        print(f"⚠️ user {error['user_id']} {error['symbol']}: {error['error']}")
+    for holding in report["untracked"]:
+        print(f"⚠️ user {holding['user_id']} {holding['symbol']}: {holding['units']} held with no ledger entries")
+    print(f"✅ Checked {report['checked']} positions: {len(report['mismatches'])} mismatches"
+          f"{' fixed' if args.apply else ''}, {len(report['errors'])} ledger errors, "
+          f"{len(report['untracked'])} holdings without ledger entries")
\ No newline at end of file
@@ -1,9 +1,16 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routes import auth, users, goals, investments, market, simulations, recommendations
+from .config import settings
+from .database import engine, async_engine, pool_stats
+from .metrics import MetricsMiddleware, cache_collector, render
+from .auth import principal_cache
+from .projection_cache import projection_cache
+from .quote_cache import quote_cache
+from .risk_service import risk_service
+from .routes import auth, users, goals, investments, market, simulations, recommendations, transactions, imports, exports
 
-Base.metadata.create_all(bind=engine)
+logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 app = FastAPI(title="Wealth Tracker API", version="1.0.0")
 
@@ -14,6 +21,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -22,6 +30,14 @@ app.include_router(investments.router)
 app.include_router(market.router)
 app.include_router(simulations.router)
 app.include_router(recommendations.router)
+app.include_router(transactions.router)
+app.include_router(imports.router)
+app.include_router(exports.router)
+
+cache_collector.register("principal", principal_cache.stats)
+cache_collector.register("projection", projection_cache.stats)
+cache_collector.register("risk", risk_service.stats)
+cache_collector.register("quote", quote_cache.stats)
 
 @app.get("/")
 def root():
@@ -29,4 +45,16 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/db")
+def health_db():
+    pools = {"sync": pool_stats(engine)}
+    if async_engine is not None:
+        pools["async"] = pool_stats(async_engine.sync_engine)
+    return {"profile": settings.DB_POOL_PROFILE, "pgbouncer": settings.DB_PGBOUNCER, "pools": pools}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, media_type = render()
+    return Response(content=content, media_type=media_type)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import argparse
+import json
+import logging
+import math
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+from .cache import LRUCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Every period yfinance accepts; "ytd" and "max" are resolved in period_start
+PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653,
+               "ytd": None, "max": None}
+
+def period_start(period: str) -> Optional[date]:
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period {period!r}; expected one of {', '.join(PERIOD_DAYS)}")
+    today = date.today()
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    days = PERIOD_DAYS[period]
+    return today - timedelta(days=days) if days is not None else None
+
+def _period_start(start: Optional[date], period: Optional[str], fallback_days: int) -> date:
+    if start is not None:
+        return start
+    return period_start(period or settings.HISTORY_INITIAL_PERIOD) or date.today() - timedelta(days=fallback_days)
+
+class MarketDataProvider:
+    name = "base"
+    batch_size = settings.MARKET_BATCH_SIZE
+    concurrency = settings.MARKET_PROVIDER_CONCURRENCY
+    
+    def quote(self, symbol: str) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    def quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        quotes = {}
+        for symbol in symbols:
+            quote = self.quote(symbol)
+            if quote:
+                quotes[symbol] = quote
+        return quotes
+    
+    def bars(self, symbol: str, start: Optional[date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        raise NotImplementedError
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+    
+    def quote(self, symbol: str) -> Optional[Dict]:
+        info = yf.Ticker(symbol).info
+        current_price = info.get('currentPrice') or info.get('regularMarketPrice')
+        if info.get('currency'):
+            self.currencies.set(symbol, info['currency'])
+        if current_price:
+            return {
+                "symbol": symbol,
+                "price": float(current_price),
+                "timestamp": datetime.utcnow(),
+                "currency": info.get('currency', 'USD')
+            }
+        return None
+    
+    def __init__(self):
+        self.currencies = LRUCache(maxsize=settings.QUOTE_CACHE_MAX_ENTRIES)
+        # Symbols whose lookup is queued or recently failed are not resubmitted until this expires
+        self._lookups = LRUCache(maxsize=settings.QUOTE_CACHE_MAX_ENTRIES, ttl=settings.CURRENCY_LOOKUP_RETRY_SECONDS)
+        self._resolver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="currency-lookup")
+        self._redis = None
+    
+    def _redis_client(self):
+        if not settings.QUOTE_CACHE_USE_REDIS:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+    
+    def currencies_for(self, symbols: List[str]) -> Dict[str, Optional[str]]:
+        """Known listing currencies, None where not yet resolved; unknown symbols are looked up in the background."""
+        known = {symbol: self.currencies.get(symbol) for symbol in symbols}
+        unknown = [symbol for symbol, currency in known.items() if currency is None]
+        client = self._redis_client()
+        if client is not None and unknown:
+            try:
+                for symbol, currency in zip(unknown, client.hmget("quote:currency", unknown)):
+                    if currency:
+                        known[symbol] = currency
+                        self.currencies.set(symbol, currency)
+            except Exception as e:
+                logger.warning("Currency cache redis read failed: %s", e)
+        
+        queued = [symbol for symbol in unknown if known[symbol] is None and self._lookups.get(symbol) is None]
+        if queued:
+            for symbol in queued:
+                self._lookups.set(symbol, True)
+            self._resolver.submit(self._resolve_currencies, queued)
+        return known
+    
+    def _resolve_currencies(self, symbols: List[str]) -> None:
+        # Runs off the refresh path: one metadata request per symbol, each made only once per listing
+        resolved = {}
+        for symbol in symbols:
+            try:
+                currency = yf.Ticker(symbol).fast_info["currency"]
+            except Exception as e:
+                logger.debug("Currency lookup for %s failed: %s", symbol, e)
+                continue
+            if currency:
+                resolved[symbol] = currency
+                self.currencies.set(symbol, currency)
+        client = self._redis_client()
+        if client is not None and resolved:
+            try:
+                client.hset("quote:currency", mapping=resolved)
+            except Exception as e:
+                logger.warning("Currency cache redis write failed: %s", e)
+    
+    @staticmethod
+    def _last_closes(symbols: List[str], period: str, interval: str) -> Dict[str, float]:
+        data = yf.download(symbols, period=period, interval=interval, group_by="ticker",
+                           threads=False, progress=False, auto_adjust=False)
+        closes = {}
+        if data.empty:
+            return closes
+        multi = data.columns.nlevels > 1
+        available = set(data.columns.get_level_values(0)) if multi else set(symbols)
+        for symbol in symbols:
+            if symbol not in available:
+                continue
+            series = (data[symbol] if multi else data)["Close"].dropna()
+            if not series.empty:
+                closes[symbol] = float(series.iloc[-1])
+        return closes
+    
+    def quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        # The latest one-minute bar tracks the live price that quote() reports; symbols without intraday data
+        # (mutual funds, for instance) fall back to their last daily close
+        prices = self._last_closes(symbols, period="1d", interval="1m")
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if missing:
+            prices.update(self._last_closes(missing, period="5d", interval="1d"))
+        currencies = self.currencies_for(list(prices))
+        return {
+            symbol: {"symbol": symbol, "price": price, "timestamp": datetime.utcnow(), "currency": currencies[symbol]}
+            for symbol, price in prices.items()
+        }
+    
+    def bars(self, symbol: str, start: Optional[date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        ticker = yf.Ticker(symbol)
+        if start is not None:
+            return ticker.history(start=start, interval="1d", auto_adjust=False)
+        return ticker.history(period=period or settings.HISTORY_INITIAL_PERIOD, interval="1d", auto_adjust=False)
+
+class AlphaVantageProvider(MarketDataProvider):
+    name = "alphavantage"
+    concurrency = 1
+    url = "https://www.alphavantage.co/query"
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.session = requests.Session()
+    
+    def _get(self, **params) -> Dict:
+        response = self.session.get(self.url, params={**params, "apikey": self.api_key}, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        for key in ("Error Message", "Note", "Information"):
+            if key in data:
+                raise RuntimeError(f"Alpha Vantage: {data[key]}")
+        return data
+    
+    def quote(self, symbol: str) -> Optional[Dict]:
+        price = self._get(function="GLOBAL_QUOTE", symbol=symbol).get("Global Quote", {}).get("05. price")
+        if price:
+            return {"symbol": symbol, "price": float(price), "timestamp": datetime.utcnow(), "currency": "USD"}
+        return None
+    
+    def quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        quotes, error = {}, None
+        for symbol in symbols:
+            try:
+                quote = self.quote(symbol)
+            except Exception as e:
+                error = e
+                continue
+            if quote:
+                quotes[symbol] = quote
+        if error is not None and not quotes:
+            raise error
+        return quotes
+    
+    def bars(self, symbol: str, start: Optional[date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        start = _period_start(start, period, fallback_days=365 * 20)
+        compact = (date.today() - start).days < 100
+        series = self._get(function="TIME_SERIES_DAILY", symbol=symbol,
+                           outputsize="compact" if compact else "full").get("Time Series (Daily)", {})
+        frame = pd.DataFrame.from_dict(series, orient="index", dtype=float)
+        if frame.empty:
+            return frame
+        frame.columns = [column.split(". ", 1)[1].capitalize() for column in frame.columns]
+        frame.index = pd.to_datetime(frame.index)
+        frame = frame.sort_index()
+        return frame[frame.index >= pd.Timestamp(start)]
+
+class LocalProvider(MarketDataProvider):
+    # Recorded prices come from MARKET_REPLAY_PATH; every other symbol gets a deterministic synthetic price
+    name = "local"
+    batch_size = 1000
+    concurrency = 64
+    epoch = date(2000, 1, 3)
+    
+    def __init__(self, path: Optional[str] = None):
+        self.recorded: Dict[str, Dict] = {}
+        if path:
+            with open(path) as f:
+                for symbol, value in json.load(f).items():
+                    self.recorded[symbol.upper()] = value if isinstance(value, dict) else {"price": value}
+    
+    @staticmethod
+    def _seed(symbol: str) -> int:
+        return zlib.crc32(symbol.encode())
+    
+    def _price(self, symbol: str, day: date) -> float:
+        seed = self._seed(symbol)
+        base = 10 + (seed % 49000) / 100
+        return round(base * (1 + 0.02 * math.sin(day.toordinal() / 7 + seed % 360)), 2)
+    
+    def quote(self, symbol: str) -> Optional[Dict]:
+        recorded = self.recorded.get(symbol)
+        return {
+            "symbol": symbol,
+            "price": float(recorded["price"]) if recorded else self._price(symbol, date.today()),
+            "timestamp": datetime.utcnow(),
+            "currency": recorded.get("currency", "USD") if recorded else "USD"
+        }
+    
+    def quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        return {symbol: self.quote(symbol) for symbol in symbols}
+    
+    def bars(self, symbol: str, start: Optional[date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        # The walk always starts at the epoch so incremental fills extend the same series
+        seed = self._seed(symbol)
+        dates = pd.bdate_range(self.epoch, date.today())
+        closes = (10 + (seed % 49000) / 100) * np.exp(np.cumsum(np.random.default_rng(seed).normal(0.0001, 0.01, len(dates))))
+        opens = np.concatenate([closes[:1], closes[:-1]])
+        frame = pd.DataFrame({
+            "Open": opens,
+            "High": np.maximum(opens, closes) * 1.005,
+            "Low": np.minimum(opens, closes) * 0.995,
+            "Close": closes,
+            "Volume": np.random.default_rng(seed + 1).integers(10_000, 5_000_000, len(dates))
+        }, index=dates)
+        return frame[frame.index >= pd.Timestamp(_period_start(start, period, fallback_days=(date.today() - self.epoch).days))]
+    
+    @staticmethod
+    def record(path: str, quotes: Dict[str, Dict]) -> None:
+        with open(path, "w") as f:
+            json.dump({symbol: {"price": quote["price"], "currency": quote.get("currency", "USD")}
+                       for symbol, quote in sorted(quotes.items())}, f, indent=2)
+
+def build_providers(names: List[str]) -> List[MarketDataProvider]:
+    providers = []
+    for name in names:
+        if name == "yfinance":
+            providers.append(YFinanceProvider())
+        elif name == "alphavantage":
+            if not settings.ALPHA_VANTAGE_API_KEY:
+                continue
+            providers.append(AlphaVantageProvider(settings.ALPHA_VANTAGE_API_KEY))
+        elif name == "local":
+            providers.append(LocalProvider(settings.MARKET_REPLAY_PATH))
+        else:
+            raise ValueError(f"Unknown market data provider {name!r}")
+    if not providers:
+        raise ValueError("MARKET_PROVIDERS does not name any usable provider")
+    return providers
+
+if __name__ == "__main__":
+    from .market_service import market_service
+    
+    parser = argparse.ArgumentParser(description="Record live quotes to a file the local provider can replay")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    
+    fetched = market_service.fetch_prices([symbol.upper() for symbol in args.symbols])
+    LocalProvider.record(args.out, fetched["prices"])
+    print(f"✅ Recorded {len(fetched['prices'])} quotes to {args.out}, {len(fetched['errors'])} failed")
\ No newline at end of file
@@ -1,50 +1,116 @@
-import yfinance as yf
-from typing import Dict, Optional
-from datetime import datetime
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from datetime import date
+from .config import settings
+from .market_providers import MarketDataProvider, build_providers
+from .metrics import upstream
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.MARKET_MAX_WORKERS, thread_name_prefix="market-data")
+_providers = build_providers(settings.MARKET_PROVIDERS)
+_provider_limits = {provider.name: threading.BoundedSemaphore(provider.concurrency) for provider in _providers}
 
 class MarketDataService:
     
     @staticmethod
     def get_current_price(symbol: str) -> Optional[Dict]:
-        try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            current_price = info.get('currentPrice') or info.get('regularMarketPrice')
-            
-            if current_price:
-                return {
-                    "symbol": symbol,
-                    "price": float(current_price),
-                    "timestamp": datetime.utcnow(),
-                    "currency": info.get('currency', 'USD')
-                }
-            return None
-        except Exception as e:
-            print(f"Error fetching price for {symbol}: {e}")
-            return None
+        for provider in _providers:
+            try:
+                with _provider_limits[provider.name], upstream(provider.name, "quote"):
+                    quote = provider.quote(symbol)
+                if quote:
+                    return quote
+            except Exception as e:
+                logger.warning("Error fetching price for %s from %s: %s", symbol, provider.name, e)
+        return None
+    
+    @staticmethod
+    def _fetch_chunk(provider: MarketDataProvider, chunk: List[str]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+        quotes = {}
+        pending = list(chunk)
+        reason = "No price returned"
+        
+        for attempt in range(settings.MARKET_MAX_RETRIES):
+            if attempt:
+                time.sleep(settings.MARKET_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+            try:
+                with _provider_limits[provider.name], upstream(provider.name, "quotes"):
+                    quotes.update(provider.quotes(pending))
+                reason = "No price returned"
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+            pending = [s for s in pending if s not in quotes]
+            if not pending:
+                break
+        
+        return quotes, {symbol: f"{provider.name}: {reason}" for symbol in pending}
+    
+    @staticmethod
+    def _fetch_with_failover(chunk: List[str]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+        quotes, errors = {}, {}
+        pending = chunk
+        for provider in _providers:
+            fetched, errors = MarketDataService._fetch_chunk(provider, pending)
+            quotes.update(fetched)
+            pending = list(errors)
+            if not pending:
+                break
+        return quotes, errors
+    
+    @staticmethod
+    def fetch_prices(symbols: list) -> Dict[str, Dict]:
+        unique = sorted(set(symbols))
+        size = max(_providers[0].batch_size, 1)
+        chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+        
+        prices, errors = {}, {}
+        futures = [_executor.submit(MarketDataService._fetch_with_failover, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            quotes, failed = future.result()
+            prices.update(quotes)
+            errors.update(failed)
+        
+        if errors:
+            logger.warning("Failed to fetch %d of %d symbols", len(errors), len(unique))
+        return {"prices": prices, "errors": errors}
     
     @staticmethod
     def get_multiple_prices(symbols: list) -> Dict[str, Optional[Dict]]:
-        results = {}
-        for symbol in symbols:
-            results[symbol] = MarketDataService.get_current_price(symbol)
-        return results
+        prices = MarketDataService.fetch_prices(symbols)["prices"]
+        return {symbol: prices.get(symbol) for symbol in symbols}
+    
+    @staticmethod
+    def fetch_bars(symbol: str, start: Optional[date] = None, period: Optional[str] = None):
+        for provider in _providers:
+            try:
+                with _provider_limits[provider.name], upstream(provider.name, "bars"):
+                    frame = provider.bars(symbol, start=start, period=period)
+                if frame is not None and not frame.empty:
+                    return frame
+            except Exception as e:
+                logger.warning("Error fetching bars for %s from %s: %s", symbol, provider.name, e)
+        return None
     
     @staticmethod
     def get_historical_data(symbol: str, period: str = "1mo") -> Optional[Dict]:
+        from .history_store import history_store, period_start
+        # An unsupported period is the caller's error and is raised rather than reported as missing data
+        start = period_start(period)
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period=period)
-            
-            if not hist.empty:
+            bars = history_store.read(symbol, start=start)
+            if len(bars):
                 return {
                     "symbol": symbol,
-                    "data": hist.to_dict('records'),
+                    "data": history_store.columns(bars),
                     "period": period
                 }
             return None
         except Exception as e:
-            print(f"Error fetching historical data for {symbol}: {e}")
+            logger.exception("Error fetching historical data for %s: %s", symbol, e)
             return None
 
 market_service = MarketDataService()
\ No newline at end of file
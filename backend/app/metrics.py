@@ -0,0 +1,148 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("app.slow_requests")
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route",
+                            ["method", "route", "status"],
+                            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database statements executed per HTTP request", ["route"],
+                            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000))
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Database time spent per HTTP request", ["route"])
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database statement latency", ["operation"])
+UPSTREAM_LATENCY = Histogram("market_data_request_duration_seconds", "Market data provider call latency",
+                             ["provider", "operation"])
+UPSTREAM_ERRORS = Counter("market_data_errors_total", "Failed market data provider calls", ["provider", "operation"])
+TASK_LATENCY = Histogram("celery_task_duration_seconds", "Celery task run time", ["task", "state"],
+                         buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+_request_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_stats", default=None)
+
+class CacheCollector:
+    
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Dict]] = {}
+    
+    def register(self, name: str, stats: Callable[[], Dict]) -> None:
+        self.sources[name] = stats
+    
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries held in the cache", labels=["cache"])
+        for name, source in self.sources.items():
+            try:
+                stats = source()
+            except Exception as e:
+                logger.warning("Cache stats for %s failed: %s", name, e)
+                continue
+            hits.add_metric([name], stats.get("hits", 0) + stats.get("stale_hits", 0))
+            misses.add_metric([name], stats.get("misses", 0))
+            size.add_metric([name], stats.get("size", stats.get("local", {}).get("size", 0)))
+        yield from (hits, misses, size)
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+def registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    # Under several worker processes each one writes its samples to disk and they are merged on scrape
+    from prometheus_client import multiprocess
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    merged.register(cache_collector)
+    return merged
+
+def render() -> tuple:
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+@contextmanager
+def upstream(provider: str, operation: str) -> Iterator[None]:
+    began = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(provider, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(provider, operation).observe(time.perf_counter() - began)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    QUERY_LATENCY.labels(statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER").observe(elapsed)
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    stats["queries"] += 1
+    stats["seconds"] += elapsed
+    # Identical statement text is folded together, which is what makes N+1 patterns stand out in the slow log
+    entry = stats["statements"].get(statement)
+    if entry is not None:
+        entry[0] += 1
+        entry[1] += elapsed
+    elif len(stats["statements"]) < settings.SLOW_REQUEST_MAX_STATEMENTS:
+        stats["statements"][statement] = [1, elapsed]
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    if exception_context.connection is not None and exception_context.connection.info.get("query_started"):
+        exception_context.connection.info["query_started"].pop()
+
+class MetricsMiddleware:
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        stats = {"queries": 0, "seconds": 0.0, "statements": {}}
+        token = _request_stats.set(stats)
+        began = time.perf_counter()
+        response = {"status": 500, "streaming": False}
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = dict(message.get("headers") or [])
+                response["streaming"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - began
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(response["status"])).observe(elapsed)
+            REQUEST_QUERIES.labels(route).observe(stats["queries"])
+            REQUEST_DB_SECONDS.labels(route).observe(stats["seconds"])
+            if elapsed >= settings.SLOW_REQUEST_SECONDS and not response["streaming"]:
+                log_slow_request(scope["method"], route, response["status"], elapsed, stats)
+
+def log_slow_request(method: str, route: str, status: int, elapsed: float, stats: Dict[str, Any]) -> None:
+    statements = sorted(stats["statements"].items(), key=lambda item: item[1][1], reverse=True)
+    lines = "".join(f"\n  {count}x {seconds * 1000:.1f}ms {' '.join(statement.split())[:500]}"
+                    for statement, (count, seconds) in statements)
+    slow_logger.warning("Slow request %s %s -> %s in %.3fs: %d queries, %.3fs in db%s", method, route, status,
+                        elapsed, stats["queries"], stats["seconds"], lines)
+
+def observe_task(task: str, state: str, seconds: float) -> None:
+    TASK_LATENCY.labels(task, state).observe(seconds)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Enum, ForeignKey, Date, Text
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Enum, ForeignKey, Date, Text, Index, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -48,6 +48,7 @@ class User(Base):
     password = Column(String, nullable=False)
     risk_profile = Column(Enum(RiskProfile), default=RiskProfile.moderate)
     kyc_status = Column(Enum(KYCStatus), default=KYCStatus.unverified)
+    birth_date = Column(Date, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     goals = relationship("Goal", back_populates="user", cascade="all, delete-orphan")
@@ -55,9 +56,11 @@ class User(Base):
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
     recommendations = relationship("Recommendation", back_populates="user", cascade="all, delete-orphan")
     simulations = relationship("Simulation", back_populates="user", cascade="all, delete-orphan")
+    portfolio_snapshots = relationship("PortfolioSnapshot", back_populates="user", cascade="all, delete-orphan")
 
 class Goal(Base):
     __tablename__ = "goals"
+    __table_args__ = (Index("ix_goals_user_id_id", "user_id", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -73,6 +76,11 @@ class Goal(Base):
 
 class Investment(Base):
     __tablename__ = "investments"
+    __table_args__ = (
+        Index("ix_investments_user_id_id", "user_id", "id"),
+        Index("ix_investments_user_id_symbol", "user_id", "symbol"),
+        Index("ix_investments_symbol", "symbol"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -89,6 +97,10 @@ class Investment(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_id_symbol_executed_at", "user_id", "symbol", "executed_at", "id"),
+        Index("ix_transactions_user_id_executed_at", "user_id", "executed_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -103,26 +115,50 @@ class Transaction(Base):
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        Index("ix_recommendations_user_id_created_at", "user_id", "created_at"),
+        # The nightly job keeps a single system recommendation per user and overwrites it in place
+        Index("uq_recommendations_user_id_system", "user_id", unique=True,
+              postgresql_where=text("source = 'system'")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
     recommendation_text = Column(Text, nullable=False)
     suggested_allocation = Column(JSONB, nullable=True)
+    source = Column(String, nullable=False, default="user", server_default="user")
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="recommendations")
 
 class Simulation(Base):
     __tablename__ = "simulations"
+    __table_args__ = (Index("ix_simulations_user_id_created_at_id", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     goal_id = Column(Integer, ForeignKey("goals.id"), nullable=True)
     scenario_name = Column(String, nullable=False)
     assumptions = Column(JSONB, nullable=False)
+    assumptions_hash = Column(String(64), nullable=True, index=True)
     results = Column(JSONB, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="simulations")
-    goal = relationship("Goal", back_populates="simulations")
\ No newline at end of file
+    goal = relationship("Goal", back_populates="simulations")
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshots"
+    __table_args__ = (UniqueConstraint("user_id", "snapshot_date", name="uq_portfolio_snapshots_user_date"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    total_value = Column(Numeric(15, 2), nullable=False)
+    total_cost = Column(Numeric(15, 2), nullable=False)
+    num_positions = Column(Integer, nullable=False)
+    allocation = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    user = relationship("User", back_populates="portfolio_snapshots")
\ No newline at end of file
@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Iterable, Iterator, List, Optional, Sequence
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from .config import settings
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_cursor(values: Sequence) -> str:
+    payload = json.dumps(list(values), default=json_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str, columns: Sequence) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError("cursor length mismatch")
+        return [datetime.fromisoformat(value) if column.type.python_type is datetime else value
+                for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def ndjson_lines(rows: Iterable, keys: Sequence[str]) -> Iterator[bytes]:
+    for row in rows:
+        mapping = row._mapping
+        yield (json.dumps({key: mapping[key] for key in keys}, default=json_default) + "\n").encode()
+
+def select_columns(model, fields: Optional[str]) -> List:
+    table = model.__table__
+    if not fields:
+        return list(table.c)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in table.c]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return [table.c[name] for name in dict.fromkeys(["id", *names])]
+
+def keyset_page(db: Session, response: Response, model, filters: Sequence, order_columns: Sequence,
+                cursor: Optional[str], limit: int, fields: Optional[str] = None, format: str = "json",
+                descending: bool = False):
+    columns = select_columns(model, fields)
+    keys = [column.key for column in columns]
+    stmt = select(*columns, *[column for column in order_columns if column.key not in keys]).where(*filters)
+    if cursor:
+        position = tuple_(*order_columns)
+        after = tuple_(*decode_cursor(cursor, order_columns))
+        stmt = stmt.where(position < after if descending else position > after)
+    stmt = stmt.order_by(*(column.desc() if descending else column.asc() for column in order_columns))
+    
+    if format == "ndjson":
+        rows = db.execute(stmt.execution_options(yield_per=settings.STREAM_BATCH_SIZE))
+        return StreamingResponse(ndjson_lines(rows, keys), media_type="application/x-ndjson")
+    
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor([getattr(rows[-1], column.key) for column in order_columns])
+    
+    if fields:
+        content = json.dumps([{key: row._mapping[key] for key in keys} for row in rows], default=json_default)
+        return Response(content=content, media_type="application/json", headers=headers)
+    response.headers.update(headers)
+    return rows
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from .config import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordPool:
+    
+    def __init__(self):
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_POOL_WORKERS,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+    
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= settings.PASSWORD_POOL_MAX_PENDING:
+                self.rejected += 1
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Authentication is busy, please retry",
+                                    headers={"Retry-After": "1"})
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+    
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        verified, new_hash = await self._submit(_verify_and_update, plain_password, hashed_password)
+        if new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return verified, new_hash
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": settings.PASSWORD_POOL_WORKERS,
+                "pending": self.pending,
+                "queue_depth": max(self.pending - settings.PASSWORD_POOL_WORKERS, 0),
+                "peak_pending": self.peak_pending,
+                "max_pending": settings.PASSWORD_POOL_MAX_PENDING,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS
+            }
+
+password_pool = PasswordPool()
\ No newline at end of file
@@ -0,0 +1,144 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy import String, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .models import Investment, PortfolioSnapshot
+
+class PortfolioService:
+    
+    @staticmethod
+    def aggregate_query(user_id: int, by_symbol: bool = False):
+        group = Investment.symbol if by_symbol else Investment.asset_type
+        return (
+            select(
+                group.label("key"),
+                func.coalesce(func.sum(Investment.current_value), 0).label("value"),
+                func.coalesce(func.sum(Investment.cost_basis), 0).label("cost"),
+                func.count().label("positions")
+            )
+            .where(Investment.user_id == user_id)
+            .group_by(group)
+        )
+    
+    @staticmethod
+    def positions_query(user_id: int):
+        return (
+            select(Investment.symbol, func.sum(Investment.units).label("units"),
+                   func.sum(Investment.cost_basis).label("cost"))
+            .where(Investment.user_id == user_id)
+            .group_by(Investment.symbol)
+        )
+    
+    @staticmethod
+    def holdings_query(user_id: int):
+        return (
+            select(Investment.symbol, Investment.asset_type, func.coalesce(func.sum(Investment.current_value), 0))
+            .where(Investment.user_id == user_id)
+            .group_by(Investment.symbol, Investment.asset_type)
+        )
+    
+    @staticmethod
+    def total_value_query(user_id: int):
+        return select(func.coalesce(func.sum(Investment.current_value), 0)).where(Investment.user_id == user_id)
+    
+    @staticmethod
+    def build_summary(rows: Iterable, symbol_rows: Optional[Iterable] = None) -> Dict[str, Any]:
+        allocation = {}
+        total_value = total_cost = 0.0
+        num_positions = 0
+        for key, value, cost, positions in rows:
+            allocation[getattr(key, "value", key)] = float(value)
+            total_value += float(value)
+            total_cost += float(cost)
+            num_positions += positions
+        
+        summary = {
+            "total_value": round(total_value, 2),
+            "total_cost": round(total_cost, 2),
+            "total_gain_loss": round(total_value - total_cost, 2),
+            "total_gain_loss_pct": round((total_value - total_cost) / total_cost * 100, 2) if total_cost > 0 else 0,
+            "allocation": allocation,
+            "num_positions": num_positions
+        }
+        if symbol_rows is not None:
+            summary["by_symbol"] = {
+                symbol: {
+                    "value": float(value),
+                    "cost": float(cost),
+                    "gain_loss": round(float(value) - float(cost), 2),
+                    "positions": positions
+                }
+                for symbol, value, cost, positions in symbol_rows
+            }
+        return summary
+    
+    @staticmethod
+    def snapshot_statement(snapshot_date: date, user_id: Optional[int] = None):
+        per_type = select(
+            Investment.user_id,
+            cast(Investment.asset_type, String).label("asset_type"),
+            func.coalesce(func.sum(Investment.current_value), 0).label("value"),
+            func.coalesce(func.sum(Investment.cost_basis), 0).label("cost"),
+            func.count().label("positions")
+        ).group_by(Investment.user_id, Investment.asset_type)
+        if user_id is not None:
+            per_type = per_type.where(Investment.user_id == user_id)
+        per_type = per_type.subquery()
+        
+        totals = select(
+            per_type.c.user_id,
+            literal(snapshot_date).label("snapshot_date"),
+            func.sum(per_type.c.value),
+            func.sum(per_type.c.cost),
+            func.sum(per_type.c.positions),
+            func.jsonb_object_agg(per_type.c.asset_type, per_type.c.value),
+            literal(datetime.utcnow()).label("created_at")
+        ).group_by(per_type.c.user_id)
+        
+        stmt = insert(PortfolioSnapshot).from_select(
+            ["user_id", "snapshot_date", "total_value", "total_cost", "num_positions", "allocation", "created_at"], totals)
+        return stmt.on_conflict_do_update(
+            constraint="uq_portfolio_snapshots_user_date",
+            set_={column: getattr(stmt.excluded, column)
+                  for column in ("total_value", "total_cost", "num_positions", "allocation", "created_at")}
+        )
+    
+    @staticmethod
+    def write_snapshots(bind, user_id: Optional[int] = None, snapshot_date: Optional[date] = None) -> int:
+        stmt = PortfolioService.snapshot_statement(snapshot_date or datetime.utcnow().date(), user_id)
+        return bind.execute(stmt).rowcount
+    
+    @staticmethod
+    def history_query(user_id: int, start: date, end: date):
+        return (
+            select(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value, PortfolioSnapshot.total_cost,
+                   PortfolioSnapshot.num_positions, PortfolioSnapshot.allocation)
+            .where(PortfolioSnapshot.user_id == user_id,
+                   PortfolioSnapshot.snapshot_date >= start,
+                   PortfolioSnapshot.snapshot_date <= end)
+            .order_by(PortfolioSnapshot.snapshot_date)
+        )
+    
+    @staticmethod
+    def summarize(db: Session, user_id: int, by_symbol: bool = False) -> Dict[str, Any]:
+        rows = db.execute(PortfolioService.aggregate_query(user_id)).all()
+        symbol_rows = db.execute(PortfolioService.aggregate_query(user_id, by_symbol=True)).all() if by_symbol else None
+        return PortfolioService.build_summary(rows, symbol_rows)
+    
+    @staticmethod
+    async def summarize_async(db: AsyncSession, user_id: int, by_symbol: bool = False) -> Dict[str, Any]:
+        rows = (await db.execute(PortfolioService.aggregate_query(user_id))).all()
+        symbol_rows = (await db.execute(PortfolioService.aggregate_query(user_id, by_symbol=True))).all() if by_symbol else None
+        return PortfolioService.build_summary(rows, symbol_rows)
+    
+    @staticmethod
+    def total_value(db: Session, user_id: int) -> float:
+        return float(db.execute(PortfolioService.total_value_query(user_id)).scalar())
+    
+    @staticmethod
+    async def total_value_async(db: AsyncSession, user_id: int) -> float:
+        return float((await db.execute(PortfolioService.total_value_query(user_id))).scalar())
+
+portfolio_service = PortfolioService()
\ No newline at end of file
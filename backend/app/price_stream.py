@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Iterable, Optional, Set
+from uuid import uuid4
+import redis.asyncio as aioredis
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .quote_cache import quote_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "prices"
+SYMBOLS_KEY = "price-stream:symbols"
+LEADER_KEY = "price-stream:leader"
+RENEW_LEADERSHIP = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class PositionBook:
+    
+    def __init__(self, rows: Iterable):
+        self.positions = {symbol: {"units": float(units), "cost": float(cost)} for symbol, units, cost in rows}
+        self.prices: Dict[str, float] = {}
+        self.loaded_at = time.monotonic()
+    
+    @property
+    def symbols(self) -> Set[str]:
+        return set(self.positions)
+    
+    def _position(self, symbol: str) -> Dict:
+        position = self.positions[symbol]
+        price = self.prices.get(symbol)
+        value = round(position["units"] * price, 2) if price is not None else None
+        return {
+            "price": price,
+            "units": position["units"],
+            "value": value,
+            "gain_loss": round(value - position["cost"], 2) if value is not None else None
+        }
+    
+    def total_value(self) -> float:
+        return round(sum(position["units"] * self.prices[symbol]
+                         for symbol, position in self.positions.items() if symbol in self.prices), 2)
+    
+    def apply(self, quotes: Dict[str, Dict]) -> Dict[str, Dict]:
+        changed = [symbol for symbol, quote in quotes.items()
+                   if symbol in self.positions and self.prices.get(symbol) != quote["price"]]
+        for symbol in changed:
+            self.prices[symbol] = quotes[symbol]["price"]
+        return {symbol: self._position(symbol) for symbol in changed}
+    
+    def snapshot(self) -> Dict:
+        return {
+            "positions": {symbol: self._position(symbol) for symbol in sorted(self.positions)},
+            "total_value": self.total_value()
+        }
+
+class Subscription:
+    
+    def __init__(self, symbols: Set[str]):
+        self.symbols = symbols
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PRICE_STREAM_QUEUE_SIZE)
+    
+    def deliver(self, quotes: Dict[str, Dict]) -> None:
+        relevant = {symbol: quote for symbol, quote in quotes.items() if symbol in self.symbols}
+        if not relevant:
+            return
+        if self.queue.full():
+            # A slow client only needs the latest prices, so drop its oldest pending update
+            self.queue.get_nowait()
+        self.queue.put_nowait(relevant)
+
+class PriceStream:
+    
+    def __init__(self):
+        self.instance_id = uuid4().hex
+        self.subscriptions: Set[Subscription] = set()
+        self.counters = {"published": 0, "delivered": 0, "polls": 0}
+        self._last_published: Dict[str, float] = {}
+        self._redis: Optional[aioredis.Redis] = None
+        self._tasks = []
+    
+    def _client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+    
+    def ensure_started(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._run())]
+    
+    def local_symbols(self) -> Set[str]:
+        return set().union(*(subscription.symbols for subscription in self.subscriptions))
+    
+    async def _register(self, symbols: Set[str]) -> None:
+        if symbols:
+            expires_at = time.time() + settings.PRICE_STREAM_SUBSCRIPTION_TTL_SECONDS
+            await self._client().zadd(SYMBOLS_KEY, {symbol: expires_at for symbol in symbols})
+    
+    async def subscribe(self, symbols: Set[str]) -> Subscription:
+        self.ensure_started()
+        subscription = Subscription(set(symbols))
+        self.subscriptions.add(subscription)
+        await self._register(subscription.symbols)
+        return subscription
+    
+    async def resubscribe(self, subscription: Subscription, symbols: Set[str]) -> None:
+        added = symbols - subscription.symbols
+        subscription.symbols = set(symbols)
+        await self._register(added)
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+    
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._client().pubsub()
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    quotes = json.loads(message["data"])
+                    for subscription in list(self.subscriptions):
+                        subscription.deliver(quotes)
+                    self.counters["delivered"] += len(self.subscriptions)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Price stream listener failed, reconnecting: %s", e)
+                await asyncio.sleep(settings.PRICE_STREAM_POLL_SECONDS)
+    
+    async def _is_leader(self) -> bool:
+        client = self._client()
+        ttl = max(int(settings.PRICE_STREAM_POLL_SECONDS * 3), 1)
+        if await client.set(LEADER_KEY, self.instance_id, nx=True, ex=ttl):
+            return True
+        return bool(await client.eval(RENEW_LEADERSHIP, 1, LEADER_KEY, self.instance_id, ttl))
+    
+    async def _poll(self) -> None:
+        client = self._client()
+        await client.zremrangebyscore(SYMBOLS_KEY, "-inf", time.time())
+        symbols = await client.zrange(SYMBOLS_KEY, 0, -1)
+        if not symbols:
+            return
+        
+        fetched = await run_in_threadpool(quote_cache.get_quotes, symbols)
+        changed = {
+            symbol: {"price": quote["price"], "timestamp": quote["timestamp"].isoformat()}
+            for symbol, quote in fetched["prices"].items()
+            if self._last_published.get(symbol) != quote["price"]
+        }
+        self.counters["polls"] += 1
+        if changed:
+            await client.publish(CHANNEL, json.dumps(changed))
+            self._last_published.update({symbol: quote["price"] for symbol, quote in changed.items()})
+            self.counters["published"] += len(changed)
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._register(self.local_symbols())
+                if await self._is_leader():
+                    await self._poll()
+                else:
+                    self._last_published.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Price stream poller failed: %s", e)
+            await asyncio.sleep(settings.PRICE_STREAM_POLL_SECONDS)
+    
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "subscriptions": len(self.subscriptions),
+            "symbols": len(self.local_symbols()),
+            "running": bool(self._tasks)
+        }
+
+price_stream = PriceStream()
\ No newline at end of file
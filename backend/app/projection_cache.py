@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+from .cache import LRUCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_VERSION_KEY = "projection:version"
+
+def assumptions_hash(assumptions: Dict[str, Any]) -> str:
+    payload = json.dumps(assumptions, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ProjectionCache:
+    
+    def __init__(self):
+        self.cache = LRUCache(maxsize=settings.PROJECTION_CACHE_MAX_ENTRIES, ttl=settings.PROJECTION_CACHE_TTL_SECONDS)
+        self._global_version = 0
+        self._versions: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._redis = None
+    
+    def _redis_client(self):
+        if not settings.PROJECTION_CACHE_USE_REDIS:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+    
+    def _version(self, user_id: int) -> Tuple[int, int]:
+        # Versions live in Redis so that an invalidation in one worker or in Celery reaches every process
+        client = self._redis_client()
+        if client is not None:
+            try:
+                shared, user = client.mget(GLOBAL_VERSION_KEY, f"{GLOBAL_VERSION_KEY}:{user_id}")
+                return int(shared or 0), int(user or 0)
+            except Exception as e:
+                logger.warning("Projection cache redis read failed, using local versions: %s", e)
+        with self._lock:
+            return self._global_version, self._versions[user_id]
+    
+    def _bump(self, key: str) -> None:
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.incr(key)
+        except Exception as e:
+            logger.warning("Projection cache redis invalidation failed: %s", e)
+    
+    def key(self, user_id: int, goal_id: int, assumptions: Dict[str, Any]) -> tuple:
+        # Build the key before reading the inputs it covers, so an invalidation that lands mid-computation
+        # leaves the result stored under the superseded version
+        return (user_id, goal_id, *self._version(user_id), assumptions_hash(assumptions))
+    
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+    
+    def set(self, key: tuple, projection: Dict[str, Any]) -> None:
+        self.cache.set(key, projection)
+    
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] += 1
+        self._bump(f"{GLOBAL_VERSION_KEY}:{user_id}")
+        self.cache.discard_where(lambda key: key[0] == user_id)
+    
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._global_version += 1
+        self._bump(GLOBAL_VERSION_KEY)
+        self.cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+projection_cache = ProjectionCache()
\ No newline at end of file
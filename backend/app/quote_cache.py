@@ -0,0 +1,180 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from .cache import LRUCache
+from .config import settings
+from .market_service import MarketDataService, market_service
+
+logger = logging.getLogger(__name__)
+
+class QuoteCache:
+    
+    def __init__(self, service: MarketDataService):
+        self.service = service
+        self.max_ttl = max([settings.QUOTE_CACHE_DEFAULT_TTL_SECONDS, *settings.QUOTE_CACHE_TTL_SECONDS.values()])
+        self.local = LRUCache(maxsize=settings.QUOTE_CACHE_MAX_ENTRIES, ttl=self.max_ttl + settings.QUOTE_CACHE_STALE_SECONDS)
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "redis_hits": 0}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-revalidate")
+        self._redis = None
+    
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+    
+    def _ttl(self, asset_type: Optional[str]) -> int:
+        return settings.QUOTE_CACHE_TTL_SECONDS.get(asset_type, settings.QUOTE_CACHE_DEFAULT_TTL_SECONDS)
+    
+    def _redis_client(self):
+        if not settings.QUOTE_CACHE_USE_REDIS:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+    
+    def _read_redis(self, symbols: List[str]) -> Dict[str, Dict]:
+        client = self._redis_client()
+        if client is None or not symbols:
+            return {}
+        try:
+            raw = client.mget([f"quote:{symbol}" for symbol in symbols])
+        except Exception as e:
+            logger.warning("Quote cache redis read failed: %s", e)
+            return {}
+        
+        entries = {}
+        for symbol, value in zip(symbols, raw):
+            if value:
+                entry = json.loads(value)
+                entry["quote"]["timestamp"] = datetime.fromisoformat(entry["quote"]["timestamp"])
+                entries[symbol] = entry
+        return entries
+    
+    def _write_redis(self, entries: Dict[str, Dict]) -> None:
+        client = self._redis_client()
+        if client is None or not entries:
+            return
+        expiry = self.max_ttl + settings.QUOTE_CACHE_STALE_SECONDS
+        try:
+            pipe = client.pipeline(transaction=False)
+            for symbol, entry in entries.items():
+                pipe.setex(f"quote:{symbol}", expiry, json.dumps(entry, default=lambda v: v.isoformat()))
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Quote cache redis write failed: %s", e)
+    
+    def store(self, quotes: Dict[str, Dict]) -> None:
+        now = time.time()
+        entries = {symbol: {"quote": quote, "fetched_at": now} for symbol, quote in quotes.items() if quote}
+        for symbol, entry in entries.items():
+            self.local.set(symbol, entry)
+        self._write_redis(entries)
+    
+    def _load(self, symbols: List[str]) -> Dict[str, Dict]:
+        self._count("upstream_calls")
+        if len(symbols) == 1:
+            quote = self.service.get_current_price(symbols[0])
+            if quote:
+                return {"prices": {symbols[0]: quote}, "errors": {}}
+            return {"prices": {}, "errors": {symbols[0]: "No price returned"}}
+        return self.service.fetch_prices(symbols)
+    
+    def _claim(self, symbols: List[str]) -> tuple:
+        owned, waiting = [], {}
+        with self._lock:
+            for symbol in symbols:
+                if symbol in self._inflight:
+                    waiting[symbol] = self._inflight[symbol]
+                else:
+                    self._inflight[symbol] = Future()
+                    owned.append(symbol)
+        return owned, waiting
+    
+    def _fetch_owned(self, owned: List[str]) -> Dict[str, Dict]:
+        try:
+            fetched = self._load(owned)
+        except Exception as e:
+            fetched = {"prices": {}, "errors": {symbol: f"{type(e).__name__}: {e}" for symbol in owned}}
+        self.store(fetched["prices"])
+        
+        with self._lock:
+            futures = {symbol: self._inflight.pop(symbol) for symbol in owned}
+        for symbol, future in futures.items():
+            future.set_result((fetched["prices"].get(symbol), fetched["errors"].get(symbol, "No price returned")))
+        return fetched
+    
+    def _revalidate(self, symbols: List[str]) -> None:
+        owned, _ = self._claim(symbols)
+        if owned:
+            self._fetch_owned(owned)
+    
+    def get_quotes(self, symbols: list, asset_types: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+        asset_types = asset_types or {}
+        unique = sorted(set(symbols))
+        now = time.time()
+        prices, errors, missing, stale = {}, {}, [], []
+        
+        entries = {symbol: self.local.get(symbol) for symbol in unique}
+        remote = self._read_redis([symbol for symbol, entry in entries.items() if entry is None])
+        self._count("redis_hits", len(remote))
+        for symbol, entry in remote.items():
+            self.local.set(symbol, entry)
+        entries.update(remote)
+        
+        for symbol in unique:
+            entry = entries.get(symbol)
+            age = now - entry["fetched_at"] if entry else None
+            ttl = self._ttl(asset_types.get(symbol))
+            if entry and age < ttl:
+                prices[symbol] = entry["quote"]
+                self._count("hits")
+            elif entry and age < ttl + settings.QUOTE_CACHE_STALE_SECONDS:
+                prices[symbol] = entry["quote"]
+                stale.append(symbol)
+                self._count("stale_hits")
+            else:
+                missing.append(symbol)
+                self._count("misses")
+        
+        if stale:
+            self._revalidator.submit(self._revalidate, stale)
+        
+        if missing:
+            owned, waiting = self._claim(missing)
+            self._count("coalesced", len(waiting))
+            if owned:
+                fetched = self._fetch_owned(owned)
+                prices.update(fetched["prices"])
+                errors.update({symbol: reason for symbol, reason in fetched["errors"].items() if symbol in owned})
+            for symbol, future in waiting.items():
+                quote, reason = future.result()
+                if quote:
+                    prices[symbol] = quote
+                else:
+                    errors[symbol] = reason
+        
+        return {"prices": prices, "errors": errors}
+    
+    def get_quote(self, symbol: str, asset_type: Optional[str] = None) -> Optional[Dict]:
+        return self.get_quotes([symbol], {symbol: asset_type} if asset_type else None)["prices"].get(symbol)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            inflight = len(self._inflight)
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0,
+            "inflight": inflight,
+            "local": self.local.stats(),
+            "redis_enabled": settings.QUOTE_CACHE_USE_REDIS
+        }
+
+quote_cache = QuoteCache(market_service)
\ No newline at end of file
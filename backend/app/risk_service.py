@@ -0,0 +1,165 @@
+import threading
+from datetime import date, timedelta
+from functools import reduce
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from .cache import LRUCache
+from .config import settings
+from .history_store import HistoryStore, history_store
+
+TRADING_DAYS = 252
+
+class RiskService:
+    
+    def __init__(self, store: HistoryStore):
+        self.store = store
+        self.cache = LRUCache(maxsize=settings.RISK_CACHE_MAX_ENTRIES, ttl=86400)
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    def symbol_closes(self, symbol: str, lookback_days: int) -> Optional[Dict[str, np.ndarray]]:
+        # Cached per symbol, so any two portfolios that share a holding share its history read
+        key = (symbol, lookback_days, date.today().isoformat())
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached or None
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self.cache.get(key)
+            if cached is None:
+                try:
+                    bars = self.store.read(symbol, start=date.today() - timedelta(days=lookback_days))
+                except ValueError:
+                    bars = []
+                # An empty dict marks a symbol without enough history, so the miss is cached too
+                cached = {}
+                if len(bars) > settings.RISK_MIN_OBSERVATIONS:
+                    cached = {"dates": np.array(bars["date"]), "close": np.array(bars["close"])}
+                self.cache.set(key, cached)
+        with self._lock:
+            self._locks.pop(key, None)
+        return cached or None
+    
+    def returns_matrix(self, symbols: List[str], lookback_days: int) -> Dict[str, Any]:
+        series, missing = {}, []
+        for symbol in symbols:
+            closes = self.symbol_closes(symbol, lookback_days)
+            if closes is None:
+                missing.append(symbol)
+            else:
+                series[symbol] = closes
+        
+        # A recently listed symbol would shrink the common window for every other holding, so symbols covering
+        # too little of the longest history are left out before the dates are intersected
+        longest = max((len(closes["dates"]) for closes in series.values()), default=0)
+        short = [symbol for symbol, closes in series.items() if len(closes["dates"]) < settings.RISK_MIN_COVERAGE * longest]
+        missing.extend(short)
+        available = sorted(set(series) - set(short))
+        if not available:
+            return {"symbols": [], "missing": missing, "returns": np.empty((0, 0))}
+        dates = reduce(np.intersect1d, (series[symbol]["dates"] for symbol in available))
+        closes = np.column_stack([
+            series[symbol]["close"][np.searchsorted(series[symbol]["dates"], dates)] for symbol in available
+        ])
+        returns = closes[1:] / closes[:-1] - 1
+        return {"symbols": available, "missing": missing, "dates": dates[1:], "returns": returns}
+    
+    def symbol_stats(self, symbols: Iterable[str], lookback_days: int) -> Dict[str, Any]:
+        symbols = sorted(set(symbols))
+        matrix = self.returns_matrix(symbols, lookback_days)
+        returns = matrix["returns"]
+        if len(matrix["symbols"]) == 0 or len(returns) < settings.RISK_MIN_OBSERVATIONS:
+            return {**matrix, "symbols": [], "missing": symbols}
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.nan_to_num(cov / np.outer(std, std))
+        return {**matrix, "mean": returns.mean(axis=0), "cov": cov, "corr": corr}
+    
+    def portfolio_risk(self, holdings: Dict[str, float], lookback_days: Optional[int] = None,
+                       confidence: Optional[float] = None, horizon_days: int = 1) -> Dict[str, Any]:
+        lookback_days = lookback_days or settings.RISK_LOOKBACK_DAYS
+        confidence = confidence or settings.RISK_CONFIDENCE
+        benchmark = settings.RISK_BENCHMARK_SYMBOL
+        holdings = {symbol: value for symbol, value in holdings.items() if value > 0}
+        total_value = sum(holdings.values())
+        if not holdings:
+            return {"total_value": 0, "message": "No positions"}
+        
+        stats = self.symbol_stats([*holdings, benchmark], lookback_days)
+        index = {symbol: i for i, symbol in enumerate(stats["symbols"])}
+        held = [symbol for symbol in sorted(holdings) if symbol in index]
+        excluded = sorted(set(holdings) - set(held))
+        if not held:
+            return {"total_value": round(total_value, 2), "excluded": excluded,
+                    "message": "Not enough price history for any position"}
+        
+        columns = np.array([index[symbol] for symbol in held])
+        values = np.array([holdings[symbol] for symbol in held])
+        weights = values / values.sum()
+        cov = stats["cov"][np.ix_(columns, columns)]
+        portfolio_returns = stats["returns"][:, columns] @ weights
+        
+        variance = float(weights @ cov @ weights)
+        sigma = np.sqrt(variance)
+        mu = float(stats["mean"][columns] @ weights)
+        scale = np.sqrt(horizon_days)
+        
+        tail = 1 - confidence
+        cutoff = np.quantile(portfolio_returns, tail)
+        historical_var = -cutoff * scale
+        historical_cvar = -portfolio_returns[portfolio_returns <= cutoff].mean() * scale
+        z = NormalDist().inv_cdf(tail)
+        parametric_var = -(mu * horizon_days + z * sigma * scale)
+        parametric_cvar = -(mu * horizon_days - sigma * scale * NormalDist().pdf(z) / tail)
+        
+        growth = np.cumprod(1 + portfolio_returns)
+        drawdowns = growth / np.maximum.accumulate(growth) - 1
+        
+        beta = None
+        if benchmark in index:
+            b = index[benchmark]
+            beta = round(float(weights @ stats["cov"][columns, b] / stats["cov"][b, b]), 4)
+        
+        contribution = weights * (cov @ weights) / variance if variance > 0 else np.zeros_like(weights)
+        invested = float(values.sum())
+        return {
+            "total_value": round(total_value, 2),
+            "covered_value": round(invested, 2),
+            "excluded": excluded,
+            "observations": int(len(portfolio_returns)),
+            "lookback_days": lookback_days,
+            "confidence": confidence,
+            "horizon_days": horizon_days,
+            "volatility_daily": round(float(sigma), 6),
+            "volatility_annual": round(float(sigma * np.sqrt(TRADING_DAYS)), 6),
+            "var": {
+                "historical": round(float(historical_var), 6),
+                "historical_amount": round(float(historical_var * invested), 2),
+                "parametric": round(float(parametric_var), 6),
+                "parametric_amount": round(float(parametric_var * invested), 2)
+            },
+            "cvar": {
+                "historical": round(float(historical_cvar), 6),
+                "historical_amount": round(float(historical_cvar * invested), 2),
+                "parametric": round(float(parametric_cvar), 6),
+                "parametric_amount": round(float(parametric_cvar * invested), 2)
+            },
+            "max_drawdown": round(float(drawdowns.min()), 6),
+            "current_drawdown": round(float(drawdowns[-1]), 6),
+            "beta": beta,
+            "benchmark": benchmark,
+            "weights": dict(zip(held, np.round(weights, 6).tolist())),
+            "risk_contribution": dict(zip(held, np.round(contribution, 6).tolist())),
+            "correlation": {
+                "symbols": held,
+                "matrix": np.round(stats["corr"][np.ix_(columns, columns)], 4).tolist()
+            }
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+risk_service = RiskService(history_store)
\ No newline at end of file
@@ -1,31 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..schemas import UserCreate, UserLogin, Token, UserResponse
 from ..models import User
-from ..auth import get_password_hash, verify_password, create_access_token, create_refresh_token
+from ..auth import create_access_token, create_refresh_token, get_current_principal
+from ..password_pool import password_pool
+from ..schemas import Principal
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
-    new_user = User(name=user.name, email=user.email, password=hashed_password, risk_profile=user.risk_profile)
+    hashed_password = await password_pool.hash(user.password)
+    new_user = User(name=user.name, email=user.email, password=hashed_password, risk_profile=user.risk_profile,
+                    birth_date=user.birth_date)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.password):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == credentials.email))).scalars().first()
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    verified, new_hash = await password_pool.verify_and_update(credentials.password, user.password)
+    if not verified:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    claims = {"sub": user.email, "uid": user.id}
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
     
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
\ No newline at end of file
+    access_token = create_access_token(data=claims)
+    refresh_token = create_refresh_token(data=claims)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+@router.get("/pool-stats")
+async def pool_stats(current_user: Principal = Depends(get_current_principal)):
+    return password_pool.stats()
\ No newline at end of file
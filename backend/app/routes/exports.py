@@ -0,0 +1,30 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..database import get_read_db
+from ..schemas import ExportDatasetEnum, ExportFormatEnum, Principal
+from ..auth import get_current_principal
+from ..export_service import MEDIA_TYPES, export_service
+
+router = APIRouter(prefix="/api/exports", tags=["Exports"])
+
+@router.get("/{dataset}")
+def export_dataset(dataset: ExportDatasetEnum, format: ExportFormatEnum = ExportFormatEnum.csv,
+                   start: Optional[date] = None, end: Optional[date] = None, fields: Optional[str] = None,
+                   gzip: bool = True, current_user: Principal = Depends(get_current_principal),
+                   db: Session = Depends(get_read_db)):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    try:
+        chunks = export_service.stream(db, dataset.value, current_user.id, format.value, start, end, fields, gzip)
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    
+    filename = f"{dataset.value}.{format.value}"
+    media_type = MEDIA_TYPES[format.value]
+    if gzip and format != ExportFormatEnum.parquet:
+        filename, media_type = f"{filename}.gz", "application/gzip"
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
\ No newline at end of file
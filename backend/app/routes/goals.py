@@ -1,35 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..schemas import GoalCreate, GoalUpdate, GoalResponse
-from ..models import User, Goal
-from ..auth import get_current_user
+from typing import List, Optional
+from ..database import get_db, get_read_db, get_async_read_db
+from ..config import settings
+from ..schemas import GoalCreate, GoalUpdate, GoalResponse, ListFormatEnum, Principal
+from ..models import Goal
+from ..auth import get_current_principal
+from ..projection_cache import projection_cache
+from ..pagination import keyset_page
 
 router = APIRouter(prefix="/api/goals", tags=["Goals"])
 
 @router.post("/", response_model=GoalResponse, status_code=201)
-async def create_goal(goal: GoalCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_goal(goal: GoalCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     new_goal = Goal(user_id=current_user.id, goal_type=goal.goal_type, target_amount=goal.target_amount, 
                     target_date=goal.target_date, monthly_contribution=goal.monthly_contribution)
     db.add(new_goal)
     db.commit()
+    projection_cache.invalidate_user(current_user.id)
     db.refresh(new_goal)
     return new_goal
 
 @router.get("/", response_model=List[GoalResponse])
-async def get_goals(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Goal).filter(Goal.user_id == current_user.id).all()
+def get_goals(response: Response, cursor: Optional[str] = None,
+              limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+              fields: Optional[str] = None, format: ListFormatEnum = ListFormatEnum.json,
+              current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_read_db)):
+    return keyset_page(db, response, Goal, [Goal.user_id == current_user.id], [Goal.id],
+                       cursor, limit, fields, format.value)
 
 @router.get("/{goal_id}", response_model=GoalResponse)
-async def get_goal(goal_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
+async def get_goal(goal_id: int, current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)):
+    goal = (await db.execute(select(Goal).where(Goal.id == goal_id, Goal.user_id == current_user.id))).scalars().first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     return goal
 
 @router.put("/{goal_id}", response_model=GoalResponse)
-async def update_goal(goal_id: int, goal_update: GoalUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_goal(goal_id: int, goal_update: GoalUpdate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
@@ -44,13 +54,15 @@ async def update_goal(goal_id: int, goal_update: GoalUpdate, current_user: User
         goal.status = goal_update.status
     
     db.commit()
+    projection_cache.invalidate_user(current_user.id)
     db.refresh(goal)
     return goal
 
 @router.delete("/{goal_id}", status_code=204)
-async def delete_goal(goal_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_goal(goal_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     db.delete(goal)
-    db.commit()
\ No newline at end of file
+    db.commit()
+    projection_cache.invalidate_user(current_user.id)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import os
+import shutil
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..database import get_db
+from ..schemas import ImportFormatEnum, ImportKindEnum, Principal
+from ..auth import get_current_principal
+from ..config import settings
+from ..import_service import import_service
+
+router = APIRouter(prefix="/api/imports", tags=["Imports"])
+
+@router.post("/{kind}")
+def import_file(kind: ImportKindEnum, response: Response, file: UploadFile = File(...),
+                format: Optional[ImportFormatEnum] = None,
+                current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    format = format.value if format else import_service.infer_format(file.filename)
+    if format is None:
+        raise HTTPException(status_code=400, detail="Cannot infer file format; pass format=csv or format=ndjson")
+    
+    if file.size is not None and file.size > settings.IMPORT_INLINE_MAX_BYTES:
+        from ..celery_config import run_import
+        job = import_service.create_job(current_user.id, kind.value, format, file.filename, file.size)
+        try:
+            os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+            with open(job["spool_path"], "wb") as spool:
+                shutil.copyfileobj(file.file, spool)
+        except OSError as e:
+            import_service.save_job({**job, "status": "failed", "error": "Could not spool upload"})
+            import_service.remove_spool(job)
+            raise HTTPException(status_code=503, detail="Import storage is unavailable") from e
+        run_import.delay(job["id"])
+        response.status_code = 202
+        return job
+    
+    return import_service.run(db, current_user.id, kind.value, file.file, format)
+
+@router.get("/jobs/{job_id}")
+def import_status(job_id: str, current_user: Principal = Depends(get_current_principal)):
+    job = import_service.get_job(job_id)
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
\ No newline at end of file
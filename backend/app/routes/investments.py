@@ -1,50 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..schemas import InvestmentCreate, InvestmentResponse
-from ..models import User, Investment
-from ..auth import get_current_user
+from typing import List, Optional
+from datetime import date, timedelta
+from ..database import get_db, get_read_db, get_async_read_db
+from ..config import settings
+from ..schemas import InvestmentCreate, InvestmentResponse, PortfolioSnapshotResponse, ListFormatEnum, Principal
+from ..models import Investment
+from ..auth import get_current_principal
+from ..projection_cache import projection_cache
+from ..portfolio_service import portfolio_service
+from ..risk_service import risk_service
+from ..pagination import keyset_page
 
 router = APIRouter(prefix="/api/investments", tags=["Investments"])
 
 @router.post("/", response_model=InvestmentResponse, status_code=201)
-async def create_investment(inv: InvestmentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_investment(inv: InvestmentCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     cost_basis = float(inv.units) * float(inv.avg_buy_price)
     new_inv = Investment(user_id=current_user.id, asset_type=inv.asset_type, symbol=inv.symbol.upper(),
                         units=inv.units, avg_buy_price=inv.avg_buy_price, cost_basis=cost_basis,
                         current_value=cost_basis, last_price=inv.avg_buy_price)
     db.add(new_inv)
     db.commit()
+    projection_cache.invalidate_user(current_user.id)
     db.refresh(new_inv)
     return new_inv
 
 @router.get("/", response_model=List[InvestmentResponse])
-async def get_investments(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Investment).filter(Investment.user_id == current_user.id).all()
+def get_investments(response: Response, cursor: Optional[str] = None,
+                    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+                    fields: Optional[str] = None, format: ListFormatEnum = ListFormatEnum.json,
+                    current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_read_db)):
+    return keyset_page(db, response, Investment, [Investment.user_id == current_user.id], [Investment.id],
+                       cursor, limit, fields, format.value)
 
 @router.get("/portfolio/summary")
-async def portfolio_summary(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    investments = db.query(Investment).filter(Investment.user_id == current_user.id).all()
-    total_value = sum(float(i.current_value) for i in investments)
-    total_cost = sum(float(i.cost_basis) for i in investments)
-    allocation = {}
-    for inv in investments:
-        allocation[inv.asset_type.value] = allocation.get(inv.asset_type.value, 0) + float(inv.current_value)
-    
-    return {
-        "total_value": round(total_value, 2),
-        "total_cost": round(total_cost, 2),
-        "total_gain_loss": round(total_value - total_cost, 2),
-        "total_gain_loss_pct": round((total_value - total_cost) / total_cost * 100, 2) if total_cost > 0 else 0,
-        "allocation": allocation,
-        "num_positions": len(investments)
-    }
+async def portfolio_summary(by_symbol: bool = False, current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)):
+    return await portfolio_service.summarize_async(db, current_user.id, by_symbol=by_symbol)
+
+@router.get("/portfolio/history", response_model=List[PortfolioSnapshotResponse])
+async def portfolio_history(start: Optional[date] = None, end: Optional[date] = None,
+                            current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)):
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    return (await db.execute(portfolio_service.history_query(current_user.id, start, end))).all()
+
+@router.get("/portfolio/risk")
+def portfolio_risk(lookback_days: int = Query(settings.RISK_LOOKBACK_DAYS, ge=60, le=3650),
+                   confidence: float = Query(settings.RISK_CONFIDENCE, gt=0.5, lt=1),
+                   horizon_days: int = Query(1, ge=1, le=252),
+                   current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_read_db)):
+    rows = db.execute(portfolio_service.aggregate_query(current_user.id, by_symbol=True)).all()
+    holdings = {symbol: float(value) for symbol, value, _, _ in rows}
+    return risk_service.portfolio_risk(holdings, lookback_days, confidence, horizon_days)
 
 @router.delete("/{id}", status_code=204)
-async def delete_investment(id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_investment(id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     inv = db.query(Investment).filter(Investment.id == id, Investment.user_id == current_user.id).first()
     if not inv:
         raise HTTPException(status_code=404, detail="Investment not found")
     db.delete(inv)
-    db.commit()
\ No newline at end of file
+    db.commit()
+    projection_cache.invalidate_user(current_user.id)
\ No newline at end of file
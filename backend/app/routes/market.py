@@ -1,28 +1,57 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
-from ..database import get_db
-from ..models import User, Investment
-from ..auth import get_current_user
-from ..market_service import market_service
+from datetime import date, datetime
+from typing import Optional
+from ..config import settings
+from ..database import get_db, get_async_read_db
+from ..models import Investment
+from ..schemas import Principal
+from ..auth import get_current_principal, get_stream_principal
+from ..quote_cache import quote_cache
+from ..history_store import history_store, period_start
+from ..projection_cache import projection_cache
+from ..portfolio_service import portfolio_service
+from ..price_stream import PositionBook, price_stream
 
 router = APIRouter(prefix="/api/market", tags=["Market"])
 
 @router.get("/price/{symbol}")
-async def get_price(symbol: str, current_user: User = Depends(get_current_user)):
-    price_data = market_service.get_current_price(symbol.upper())
+def get_price(symbol: str, current_user: Principal = Depends(get_current_principal)):
+    price_data = quote_cache.get_quote(symbol.upper())
     if not price_data:
         return {"error": f"Could not fetch price for {symbol}"}
     return price_data
 
+@router.get("/history/{symbol}")
+def get_history(symbol: str, start: Optional[date] = None, end: Optional[date] = None, period: Optional[str] = None,
+                current_user: Principal = Depends(get_current_principal)):
+    symbol = symbol.upper()
+    try:
+        if period and start is None:
+            start = period_start(period)
+        bars = history_store.read(symbol, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not len(bars):
+        raise HTTPException(status_code=404, detail=f"No price history for {symbol}")
+    content = json.dumps({"symbol": symbol, **history_store.columns(bars)})
+    return Response(content=content, media_type="application/json")
+
 @router.post("/refresh-prices")
-async def refresh_prices(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def refresh_prices(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     investments = db.query(Investment).filter(Investment.user_id == current_user.id).all()
     if not investments:
         return {"message": "No investments", "updated": 0}
     
     symbols = list(set([inv.symbol for inv in investments]))
-    prices = market_service.get_multiple_prices(symbols)
+    fetched = quote_cache.get_quotes(symbols, {inv.symbol: inv.asset_type.value for inv in investments})
+    prices = fetched["prices"]
     updated = 0
     
     for inv in investments:
@@ -30,8 +59,73 @@ async def refresh_prices(current_user: User = Depends(get_current_user), db: Ses
         if price_data and price_data.get('price'):
             inv.last_price = price_data['price']
             inv.current_value = float(inv.units) * float(price_data['price'])
-            inv.last_price_at = datetime.utcnow()
+            # A stale-while-revalidate hit carries its original fetch time, which is what the price is as of
+            inv.last_price_at = price_data.get('timestamp') or datetime.utcnow()
             updated += 1
     
+    # The session does not autoflush, and the snapshot is an INSERT ... SELECT over the refreshed rows
+    db.flush()
+    portfolio_service.write_snapshots(db, current_user.id)
     db.commit()
-    return {"message": f"Updated {updated} investments", "updated": updated, "total": len(investments)}
\ No newline at end of file
+    projection_cache.invalidate_user(current_user.id)
+    return {"message": f"Updated {updated} investments", "updated": updated, "total": len(investments),
+            "failed": fetched["errors"]}
+
+@router.get("/cache/stats")
+async def cache_stats(current_user: Principal = Depends(get_current_principal)):
+    return quote_cache.stats()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _load_positions(db: AsyncSession, user_id: int) -> PositionBook:
+    rows = (await db.execute(portfolio_service.positions_query(user_id))).all()
+    # Release the pooled connection; the session is reused for the next reload
+    await db.close()
+    return PositionBook(rows)
+
+@router.get("/stream")
+async def stream_prices(request: Request, current_user: Principal = Depends(get_stream_principal),
+                        db: AsyncSession = Depends(get_async_read_db)):
+    book = await _load_positions(db, current_user.id)
+    
+    async def events():
+        nonlocal book
+        subscription = await price_stream.subscribe(book.symbols)
+        try:
+            if book.symbols:
+                fetched = await run_in_threadpool(quote_cache.get_quotes, list(book.symbols))
+                book.apply(fetched["prices"])
+            yield _sse("snapshot", book.snapshot())
+            
+            while not await request.is_disconnected():
+                try:
+                    quotes = await asyncio.wait_for(subscription.queue.get(), timeout=settings.PRICE_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if time.monotonic() - book.loaded_at > settings.PRICE_STREAM_POSITIONS_TTL_SECONDS:
+                    previous = book
+                    book = await _load_positions(db, current_user.id)
+                    book.prices = {symbol: price for symbol, price in previous.prices.items() if symbol in book.positions}
+                    added = book.symbols - previous.symbols
+                    if added:
+                        fetched = await run_in_threadpool(quote_cache.get_quotes, list(added))
+                        book.apply(fetched["prices"])
+                    await price_stream.resubscribe(subscription, book.symbols)
+                    if book.positions != previous.positions:
+                        yield _sse("snapshot", book.snapshot())
+                
+                changed = book.apply(quotes)
+                if changed:
+                    yield _sse("positions", {"positions": changed, "total_value": book.total_value()})
+        finally:
+            price_stream.unsubscribe(subscription)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/stream/stats")
+async def stream_stats(current_user: Principal = Depends(get_current_principal)):
+    return price_stream.stats()
\ No newline at end of file
@@ -1,27 +1,24 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..models import User, Recommendation
-from ..auth import get_current_user
-from ..simulation_service import simulation_service
+from ..models import Recommendation
+from ..schemas import AllocationMethodEnum, UserResponse
+from ..auth import get_current_profile
+from ..allocation_service import allocation_service
+from ..portfolio_service import portfolio_service
 
 router = APIRouter(prefix="/api/recommendations", tags=["Recommendations"])
 
 @router.get("/generate")
-async def generate_recommendation(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    allocation = simulation_service.generate_allocation_recommendation(current_user.risk_profile.value, 35)
+def generate_recommendation(method: AllocationMethodEnum = AllocationMethodEnum.mean_variance,
+                            current_user: UserResponse = Depends(get_current_profile), db: Session = Depends(get_db)):
+    profile = current_user.risk_profile.value
+    holdings = db.execute(portfolio_service.holdings_query(current_user.id)).all()
+    allocation = allocation_service.recommend(profile, current_user.birth_date, holdings, method.value)
     
-    text = f"""Based on {current_user.risk_profile.value} risk profile:
-{allocation['description']}
-
-Recommended:
-- Stocks: {allocation['stocks']}%
-- Bonds: {allocation['bonds']}%
-- Cash: {allocation['cash']}%
-"""
-    
-    rec = Recommendation(user_id=current_user.id, title=f"Allocation - {current_user.risk_profile.value.title()}",
-                        recommendation_text=text, suggested_allocation=allocation)
+    rec = Recommendation(user_id=current_user.id, title=f"Allocation - {profile.title()}",
+                        recommendation_text=allocation_service.recommendation_text(profile, allocation),
+                        suggested_allocation=allocation)
     db.add(rec)
     db.commit()
     db.refresh(rec)
@@ -1,41 +1,149 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..schemas import SimulationCreate, SimulationResponse
-from ..models import User, Simulation, Goal, Investment
-from ..auth import get_current_user
-from ..simulation_service import simulation_service
+from typing import List, Optional
+from ..database import get_db, get_read_db, get_async_read_db
+from ..config import settings
+from ..schemas import SimulationCreate, SimulationResponse, SimulationModeEnum, SimulationSweep, SweepRange, ListFormatEnum, Principal
+from ..models import Simulation, Goal
+from ..auth import get_current_principal
+from ..simulation_service import simulation_service, SWEEP_DIMENSIONS
+from ..projection_cache import projection_cache, assumptions_hash
+from ..portfolio_service import portfolio_service
+from ..pagination import keyset_page
 
 router = APIRouter(prefix="/api/simulations", tags=["Simulations"])
 
+def _invalid_assumptions(e: ValidationError) -> HTTPException:
+    return HTTPException(status_code=400, detail=e.errors(include_url=False, include_context=False, include_input=False))
+
 @router.post("/", response_model=SimulationResponse, status_code=201)
-async def create_simulation(sim: SimulationCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_simulation(sim: SimulationCreate, response: Response, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    try:
+        scenario_hash = assumptions_hash({"goal_id": sim.goal_id, **simulation_service.normalize_assumptions(sim.assumptions)})
+    except ValidationError as e:
+        raise _invalid_assumptions(e)
+    existing = db.query(Simulation).filter(Simulation.user_id == current_user.id,
+                                           Simulation.assumptions_hash == scenario_hash,
+                                           Simulation.scenario_name == sim.scenario_name).first()
+    if existing:
+        response.status_code = 200
+        return existing
+    
     results = simulation_service.run_what_if_scenario({}, sim.assumptions)
     new_sim = Simulation(user_id=current_user.id, goal_id=sim.goal_id, scenario_name=sim.scenario_name,
-                        assumptions=sim.assumptions, results=results)
+                        assumptions=sim.assumptions, assumptions_hash=scenario_hash, results=results)
     db.add(new_sim)
     db.commit()
     db.refresh(new_sim)
     return new_sim
 
+@router.post("/sweep")
+def sweep_simulation(sweep: SimulationSweep, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    unknown = set(sweep.grid) - set(SWEEP_DIMENSIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported sweep dimensions: {', '.join(sorted(unknown))}")
+    
+    base = {"expected_return": 0.07, "inflation_rate": 0.03, "current_savings": 0}
+    if sweep.goal_id is not None:
+        goal = db.query(Goal).filter(Goal.id == sweep.goal_id, Goal.user_id == current_user.id).first()
+        if not goal:
+            raise HTTPException(status_code=404, detail="Goal not found")
+        base.update(target_amount=float(goal.target_amount), target_date=goal.target_date,
+                    monthly_contribution=float(goal.monthly_contribution),
+                    current_savings=portfolio_service.total_value(db, current_user.id))
+    try:
+        base.update(simulation_service.validate_assumptions(sweep.assumptions))
+    except ValidationError as e:
+        raise _invalid_assumptions(e)
+    if "target_amount" not in base or "target_date" not in base:
+        raise HTTPException(status_code=400, detail="target_amount and target_date are required without a goal_id")
+    target_date = date.fromisoformat(base["target_date"]) if isinstance(base["target_date"], str) else base["target_date"]
+    
+    grid = {}
+    for name in SWEEP_DIMENSIONS:
+        spec = sweep.grid.get(name, [base.get(name, 0)])
+        if isinstance(spec, SweepRange):
+            if (spec.stop - spec.start) / spec.step >= settings.SWEEP_MAX_POINTS:
+                raise HTTPException(status_code=400, detail=f"Sweep exceeds {settings.SWEEP_MAX_POINTS} points")
+            spec = np.round(np.arange(spec.start, spec.stop + spec.step / 2, spec.step), 10).tolist()
+        if not spec:
+            raise HTTPException(status_code=400, detail=f"Empty sweep dimension: {name}")
+        grid[name] = spec
+    if np.prod([len(values) for values in grid.values()]) > settings.SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Sweep exceeds {settings.SWEEP_MAX_POINTS} points")
+    
+    result = simulation_service.calculate_projection_grid(
+        target_amount=float(base["target_amount"]),
+        target_date=target_date,
+        current_savings=float(base["current_savings"]),
+        grid=grid
+    )
+    if result["months_remaining"] <= 0:
+        raise HTTPException(status_code=400, detail="Target date has passed")
+    
+    simulation_id = None
+    if sweep.persist:
+        assumptions = {**base, "target_date": target_date.isoformat(), "mode": "sweep", "grid": grid}
+        new_sim = Simulation(user_id=current_user.id, goal_id=sweep.goal_id, scenario_name=sweep.scenario_name or "Sweep",
+                            assumptions=assumptions, results=result)
+        db.add(new_sim)
+        db.commit()
+        simulation_id = new_sim.id
+    return {"simulation_id": simulation_id, **result}
+
 @router.get("/", response_model=List[SimulationResponse])
-async def get_simulations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Simulation).filter(Simulation.user_id == current_user.id).order_by(Simulation.created_at.desc()).all()
+def get_simulations(response: Response, cursor: Optional[str] = None,
+                    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+                    fields: Optional[str] = None, format: ListFormatEnum = ListFormatEnum.json,
+                    current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_read_db)):
+    return keyset_page(db, response, Simulation, [Simulation.user_id == current_user.id],
+                       [Simulation.created_at, Simulation.id], cursor, limit, fields, format.value, descending=True)
 
 @router.post("/goal/{goal_id}/project")
-async def project_goal(goal_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
+async def project_goal(goal_id: int, mode: SimulationModeEnum = SimulationModeEnum.deterministic,
+                       num_paths: Optional[int] = Query(None, gt=0, le=settings.MONTE_CARLO_MAX_PATHS),
+                       volatility: float = Query(settings.MONTE_CARLO_DEFAULT_VOLATILITY, ge=0),
+                       seed: Optional[int] = None,
+                       current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)):
+    goal = (await db.execute(select(Goal).where(Goal.id == goal_id, Goal.user_id == current_user.id))).scalars().first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    investments = db.query(Investment).filter(Investment.user_id == current_user.id).all()
-    current_savings = sum(float(inv.current_value) for inv in investments)
+    assumptions = simulation_service.normalize_assumptions({
+        "mode": mode.value, "num_paths": num_paths, "volatility": volatility, "seed": seed,
+        "target_amount": float(goal.target_amount), "monthly_contribution": float(goal.monthly_contribution),
+        "target_date": goal.target_date
+    })
+    cache_key = await run_in_threadpool(projection_cache.key, current_user.id, goal_id, assumptions)
+    cached = projection_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    projection = simulation_service.calculate_goal_projection(
-        target_amount=float(goal.target_amount),
-        monthly_contribution=float(goal.monthly_contribution),
-        target_date=goal.target_date,
-        current_savings=current_savings
-    )
+    current_savings = await portfolio_service.total_value_async(db, current_user.id)
+    
+    if mode == SimulationModeEnum.monte_carlo:
+        projection = await run_in_threadpool(
+            simulation_service.run_monte_carlo,
+            target_amount=float(goal.target_amount),
+            monthly_contribution=float(goal.monthly_contribution),
+            target_date=goal.target_date,
+            current_savings=current_savings,
+            volatility=volatility,
+            num_paths=num_paths,
+            seed=seed
+        )
+    else:
+        projection = simulation_service.calculate_goal_projection(
+            target_amount=float(goal.target_amount),
+            monthly_contribution=float(goal.monthly_contribution),
+            target_date=goal.target_date,
+            current_savings=current_savings
+        )
+    projection_cache.set(cache_key, projection)
     return projection
\ No newline at end of file
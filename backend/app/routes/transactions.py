@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Body
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database import get_db, get_read_db
+from ..schemas import TransactionCreate, TransactionResponse, Principal
+from ..models import Transaction
+from ..auth import get_current_principal
+from ..config import settings
+from ..ledger_service import ledger_service
+from ..projection_cache import projection_cache
+
+router = APIRouter(prefix="/api/transactions", tags=["Transactions"])
+
+@router.post("/", response_model=TransactionResponse, status_code=201)
+def create_transaction(txn: TransactionCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    try:
+        ledger_service.update_positions(db, current_user.id, [txn])
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    new_txn = Transaction(**ledger_service.transaction_rows(current_user.id, [txn])[0])
+    db.add(new_txn)
+    db.commit()
+    db.refresh(new_txn)
+    projection_cache.invalidate_user(current_user.id)
+    return new_txn
+
+@router.post("/bulk", status_code=201)
+def create_transactions_bulk(transactions: List[TransactionCreate] = Body(..., min_length=1, max_length=settings.LEDGER_MAX_BATCH),
+                             current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    try:
+        positions = ledger_service.update_positions(db, current_user.id, transactions)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.execute(insert(Transaction), ledger_service.transaction_rows(current_user.id, transactions))
+    db.commit()
+    projection_cache.invalidate_user(current_user.id)
+    return {"message": f"Recorded {len(transactions)} transactions", "inserted": len(transactions), "positions": positions}
+
+@router.get("/", response_model=List[TransactionResponse])
+def get_transactions(symbol: Optional[str] = None, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_read_db)):
+    query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
+    if symbol:
+        query = query.filter(Transaction.symbol == symbol.upper())
+    return query.order_by(Transaction.executed_at.desc(), Transaction.id.desc()).all()
\ No newline at end of file
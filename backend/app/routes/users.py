@@ -3,22 +3,25 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..schemas import UserResponse, UserUpdate
 from ..models import User
-from ..auth import get_current_user
+from ..auth import get_current_user, get_current_profile
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
 @router.get("/me", response_model=UserResponse)
-async def get_profile(current_user: User = Depends(get_current_user)):
+async def get_profile(current_user: UserResponse = Depends(get_current_profile)):
     return current_user
 
 @router.put("/me", response_model=UserResponse)
-async def update_profile(user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if user_update.name:
         current_user.name = user_update.name
     if user_update.risk_profile:
         current_user.risk_profile = user_update.risk_profile
     if user_update.kyc_status:
         current_user.kyc_status = user_update.kyc_status
+    if "birth_date" in user_update.model_fields_set:
+        # An explicit null clears the birth date
+        current_user.birth_date = user_update.birth_date
     db.commit()
     db.refresh(current_user)
     return current_user
\ No newline at end of file
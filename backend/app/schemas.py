@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime, date
 from enum import Enum
 
@@ -30,6 +30,36 @@ class AssetTypeEnum(str, Enum):
     bond = "bond"
     cash = "cash"
 
+class SimulationModeEnum(str, Enum):
+    deterministic = "deterministic"
+    monte_carlo = "monte_carlo"
+
+class AllocationMethodEnum(str, Enum):
+    mean_variance = "mean_variance"
+    risk_parity = "risk_parity"
+
+class ListFormatEnum(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+
+class ImportKindEnum(str, Enum):
+    investments = "investments"
+    transactions = "transactions"
+
+class ImportFormatEnum(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+class ExportDatasetEnum(str, Enum):
+    investments = "investments"
+    transactions = "transactions"
+    simulations = "simulations"
+
+class ExportFormatEnum(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
+
 class TransactionTypeEnum(str, Enum):
     buy = "buy"
     sell = "sell"
@@ -42,6 +72,7 @@ class UserCreate(BaseModel):
     email: EmailStr
     password: str
     risk_profile: Optional[RiskProfileEnum] = RiskProfileEnum.moderate
+    birth_date: Optional[date] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -51,6 +82,7 @@ class UserUpdate(BaseModel):
     name: Optional[str] = None
     risk_profile: Optional[RiskProfileEnum] = None
     kyc_status: Optional[KYCStatusEnum] = None
+    birth_date: Optional[date] = None
 
 class UserResponse(BaseModel):
     id: int
@@ -58,6 +90,7 @@ class UserResponse(BaseModel):
     email: str
     risk_profile: RiskProfileEnum
     kyc_status: KYCStatusEnum
+    birth_date: Optional[date] = None
     created_at: datetime
     class Config:
         from_attributes = True
@@ -69,6 +102,11 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
+
+class Principal(BaseModel):
+    id: int
+    email: str
 
 class GoalCreate(BaseModel):
     goal_type: GoalTypeEnum
@@ -118,12 +156,23 @@ class InvestmentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PortfolioSnapshotResponse(BaseModel):
+    snapshot_date: date
+    total_value: float
+    total_cost: float
+    num_positions: int
+    allocation: Dict[str, Any]
+    class Config:
+        from_attributes = True
+
 class TransactionCreate(BaseModel):
     symbol: str
     type: TransactionTypeEnum
     quantity: float = Field(gt=0)
     price: float = Field(gt=0)
     fees: Optional[float] = Field(0, ge=0)
+    asset_type: AssetTypeEnum = AssetTypeEnum.stock
+    executed_at: Optional[datetime] = None
 
 class TransactionResponse(BaseModel):
     id: int
@@ -152,6 +201,20 @@ class RecommendationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ScenarioAssumptions(BaseModel):
+    mode: SimulationModeEnum = SimulationModeEnum.deterministic
+    expected_return: Optional[float] = Field(None, gt=-1)
+    inflation_rate: Optional[float] = Field(None, gt=-1)
+    volatility: Optional[float] = Field(None, ge=0)
+    num_paths: Optional[int] = Field(None, ge=1)
+    seed: Optional[int] = Field(None, ge=0)
+    target_amount: Optional[float] = None
+    monthly_contribution: Optional[float] = None
+    current_savings: Optional[float] = None
+    target_date: Optional[date] = None
+    class Config:
+        extra = "allow"
+
 class SimulationCreate(BaseModel):
     goal_id: Optional[int] = None
     scenario_name: str
@@ -166,4 +229,16 @@ class SimulationResponse(BaseModel):
     results: Dict[str, Any]
     created_at: datetime
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float = Field(gt=0)
+
+class SimulationSweep(BaseModel):
+    goal_id: Optional[int] = None
+    scenario_name: Optional[str] = None
+    assumptions: Dict[str, Any] = {}
+    grid: Dict[str, Union[List[float], SweepRange]]
+    persist: bool = False
\ No newline at end of file
@@ -1,10 +1,44 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 import math
+import numpy as np
+from .config import settings
+from .schemas import ScenarioAssumptions
+
+SWEEP_DIMENSIONS = ("monthly_contribution", "expected_return", "inflation_rate")
 
 class SimulationService:
     
+    @staticmethod
+    def _months_remaining(target_date: date) -> int:
+        today = datetime.now().date()
+        return (target_date.year - today.year) * 12 + (target_date.month - today.month)
+    
+    @staticmethod
+    def validate_assumptions(assumptions: Dict[str, Any]) -> Dict[str, Any]:
+        # Raises pydantic.ValidationError (a ValueError) for unknown modes and out-of-range or non-numeric values
+        return ScenarioAssumptions.model_validate(assumptions).model_dump(mode="json", exclude_unset=True, exclude_none=True)
+    
+    @staticmethod
+    def normalize_assumptions(assumptions: Dict[str, Any]) -> Dict[str, Any]:
+        assumptions = SimulationService.validate_assumptions(assumptions)
+        normalized = {"mode": "deterministic", "expected_return": 0.07, "inflation_rate": 0.03, **assumptions}
+        if normalized["mode"] == "monte_carlo":
+            normalized.setdefault("volatility", settings.MONTE_CARLO_DEFAULT_VOLATILITY)
+            normalized["num_paths"] = min(int(normalized.get("num_paths") or settings.MONTE_CARLO_DEFAULT_PATHS),
+                                          settings.MONTE_CARLO_MAX_PATHS)
+        else:
+            for key in ("volatility", "num_paths", "seed"):
+                normalized.pop(key, None)
+        for key, value in normalized.items():
+            if isinstance(value, float):
+                normalized[key] = round(value, 10)
+            elif isinstance(value, date):
+                normalized[key] = value.isoformat()
+        normalized["as_of"] = datetime.now().strftime("%Y-%m")
+        return normalized
+    
     @staticmethod
     def calculate_goal_projection(
         target_amount: float,
@@ -15,8 +49,7 @@ class SimulationService:
         inflation_rate: float = 0.03
     ) -> Dict[str, Any]:
         
-        today = datetime.now().date()
-        months_remaining = (target_date.year - today.year) * 12 + (target_date.month - today.month)
+        months_remaining = SimulationService._months_remaining(target_date)
         
         if months_remaining <= 0:
             return {
@@ -63,38 +96,160 @@ class SimulationService:
             }
         }
     
+    @staticmethod
+    def run_monte_carlo(
+        target_amount: float,
+        monthly_contribution: float,
+        target_date: date,
+        current_savings: float = 0,
+        expected_return: float = 0.07,
+        volatility: float = 0.15,
+        inflation_rate: float = 0.03,
+        num_paths: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        
+        months_remaining = SimulationService._months_remaining(target_date)
+        num_paths = min(int(num_paths or settings.MONTE_CARLO_DEFAULT_PATHS), settings.MONTE_CARLO_MAX_PATHS)
+        if num_paths < 1:
+            raise ValueError("num_paths must be at least 1")
+        if volatility < 0:
+            raise ValueError("volatility must not be negative")
+        
+        if months_remaining <= 0:
+            return {
+                "mode": "monte_carlo",
+                "is_achievable": False,
+                "shortage": target_amount - current_savings,
+                "message": "Target date has passed",
+                "months_remaining": 0
+            }
+        
+        monthly_sigma = volatility / math.sqrt(12)
+        monthly_mu = math.log1p(expected_return / 12) - monthly_sigma ** 2 / 2
+        checkpoints = np.unique(np.append(np.arange(11, months_remaining, 12), months_remaining - 1))
+        rng = np.random.default_rng(seed)
+        
+        final_values = np.empty(num_paths)
+        checkpoint_values = np.empty((num_paths, len(checkpoints)))
+        for start in range(0, num_paths, settings.MONTE_CARLO_CHUNK_PATHS):
+            stop = min(start + settings.MONTE_CARLO_CHUNK_PATHS, num_paths)
+            growth = rng.normal(monthly_mu, monthly_sigma, size=(stop - start, months_remaining))
+            np.cumsum(growth, axis=1, out=growth)
+            np.exp(growth, out=growth)
+            values = np.reciprocal(growth)
+            np.cumsum(values, axis=1, out=values)
+            values *= monthly_contribution
+            values += current_savings
+            values *= growth
+            final_values[start:stop] = values[:, -1]
+            checkpoint_values[start:stop] = values[:, checkpoints]
+        
+        bands = np.percentile(checkpoint_values, [10, 50, 90], axis=0)
+        final_p10, final_p50, final_p90 = np.percentile(final_values, [10, 50, 90])
+        shortfalls = target_amount - final_values[final_values < target_amount]
+        success_probability = 1 - len(shortfalls) / num_paths
+        inflation_adjusted_target = target_amount * math.pow(1 + inflation_rate, months_remaining / 12)
+        
+        return {
+            "mode": "monte_carlo",
+            "is_achievable": success_probability >= 0.5,
+            "success_probability": round(float(success_probability), 4),
+            "projected_value": round(float(final_p50), 2),
+            "target_amount": target_amount,
+            "inflation_adjusted_target": round(inflation_adjusted_target, 2),
+            "months_remaining": months_remaining,
+            "num_paths": num_paths,
+            "final_value": {
+                "p10": round(float(final_p10), 2),
+                "p50": round(float(final_p50), 2),
+                "p90": round(float(final_p90), 2),
+                "mean": round(float(final_values.mean()), 2)
+            },
+            "percentile_bands": {
+                "months": (checkpoints + 1).tolist(),
+                "p10": np.round(bands[0], 2).tolist(),
+                "p50": np.round(bands[1], 2).tolist(),
+                "p90": np.round(bands[2], 2).tolist()
+            },
+            "shortfall": {
+                "probability": round(1 - float(success_probability), 4),
+                "expected": round(float(shortfalls.sum() / num_paths), 2),
+                "p10": round(float(np.percentile(shortfalls, 10)), 2) if len(shortfalls) else 0,
+                "p50": round(float(np.percentile(shortfalls, 50)), 2) if len(shortfalls) else 0,
+                "p90": round(float(np.percentile(shortfalls, 90)), 2) if len(shortfalls) else 0
+            },
+            "assumptions": {
+                "expected_annual_return": f"{expected_return * 100}%",
+                "annual_volatility": f"{volatility * 100}%",
+                "inflation_rate": f"{inflation_rate * 100}%",
+                "seed": seed
+            }
+        }
+    
+    @staticmethod
+    def calculate_projection_grid(
+        target_amount: float,
+        target_date: date,
+        current_savings: float,
+        grid: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        
+        months_remaining = SimulationService._months_remaining(target_date)
+        axes = np.meshgrid(*(np.asarray(grid[name], dtype=float) for name in SWEEP_DIMENSIONS), indexing="ij")
+        monthly_contribution, expected_return, inflation_rate = (axis.ravel() for axis in axes)
+        
+        monthly_rate = expected_return / 12
+        growth = np.power(1 + monthly_rate, months_remaining)
+        future_value_current = current_savings * growth
+        annuity_factor = np.where(monthly_rate > 0, (growth - 1) / np.where(monthly_rate > 0, monthly_rate, 1), months_remaining)
+        total_future_value = future_value_current + monthly_contribution * annuity_factor
+        inflation_adjusted_target = target_amount * np.power(1 + inflation_rate, months_remaining / 12)
+        is_achievable = total_future_value >= target_amount
+        remaining_needed = target_amount - future_value_current
+        required_monthly = np.where(~is_achievable & (remaining_needed > 0), remaining_needed / annuity_factor, monthly_contribution)
+        
+        return {
+            "size": int(total_future_value.size),
+            "shape": [len(grid[name]) for name in SWEEP_DIMENSIONS],
+            "months_remaining": months_remaining,
+            "target_amount": target_amount,
+            "current_savings": current_savings,
+            "columns": {
+                "monthly_contribution": monthly_contribution.tolist(),
+                "expected_return": expected_return.tolist(),
+                "inflation_rate": inflation_rate.tolist(),
+                "projected_value": np.round(total_future_value, 2).tolist(),
+                "inflation_adjusted_target": np.round(inflation_adjusted_target, 2).tolist(),
+                "surplus_or_shortage": np.round(total_future_value - target_amount, 2).tolist(),
+                "required_monthly": np.round(required_monthly, 2).tolist(),
+                "is_achievable": is_achievable.tolist()
+            }
+        }
+    
     @staticmethod
     def run_what_if_scenario(base_assumptions: Dict[str, Any], variations: Dict[str, Any]) -> Dict[str, Any]:
-        scenario_assumptions = {**base_assumptions, **variations}
-        result = SimulationService.calculate_goal_projection(
+        scenario_assumptions = {**base_assumptions, **SimulationService.validate_assumptions(variations)}
+        target_date = scenario_assumptions.get('target_date', date.today())
+        if isinstance(target_date, str):
+            target_date = date.fromisoformat(target_date)
+        params = dict(
             target_amount=scenario_assumptions.get('target_amount', 0),
             monthly_contribution=scenario_assumptions.get('monthly_contribution', 0),
-            target_date=scenario_assumptions.get('target_date', date.today()),
+            target_date=target_date,
             current_savings=scenario_assumptions.get('current_savings', 0),
             expected_return=scenario_assumptions.get('expected_return', 0.07),
             inflation_rate=scenario_assumptions.get('inflation_rate', 0.03)
         )
+        if scenario_assumptions.get('mode') == "monte_carlo":
+            result = SimulationService.run_monte_carlo(
+                **params,
+                volatility=scenario_assumptions.get('volatility', settings.MONTE_CARLO_DEFAULT_VOLATILITY),
+                num_paths=scenario_assumptions.get('num_paths'),
+                seed=scenario_assumptions.get('seed')
+            )
+        else:
+            result = SimulationService.calculate_goal_projection(**params)
         return {"scenario_assumptions": scenario_assumptions, "results": result}
-    
-    @staticmethod
-    def generate_allocation_recommendation(risk_profile: str, age: int = 35) -> Dict[str, Any]:
-        allocations = {
-            "conservative": {"stocks": 30, "bonds": 50, "cash": 20, "description": "Focus on capital preservation"},
-            "moderate": {"stocks": 60, "bonds": 30, "cash": 10, "description": "Balanced approach"},
-            "aggressive": {"stocks": 80, "bonds": 15, "cash": 5, "description": "Growth-focused"}
-        }
-        allocation = allocations.get(risk_profile.lower(), allocations["moderate"])
-        
-        if age:
-            suggested_bonds = min(age, 70)
-            suggested_stocks = 100 - suggested_bonds - 10
-            allocation["age_adjusted"] = {
-                "stocks": max(suggested_stocks, 20),
-                "bonds": min(suggested_bonds, 60),
-                "cash": 10,
-                "note": f"Adjusted for age {age}"
-            }
-        
-        return allocation
 
 simulation_service = SimulationService()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import time
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import DateTime, Numeric, String, cast, column, select, update, values
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .config import settings
+from .database import engine
+from .models import Investment
+
+class ValuationService:
+    
+    @staticmethod
+    def distinct_symbols(db: Session) -> List[str]:
+        return list(db.execute(select(Investment.symbol).distinct().order_by(Investment.symbol)).scalars())
+    
+    @staticmethod
+    def apply_prices(quotes: Dict[str, Dict], chunk_size: int = None, bind: Engine = engine) -> Dict:
+        symbols = sorted(symbol for symbol, quote in quotes.items() if quote and quote.get("price"))
+        size = chunk_size or settings.VALUATION_CHUNK_SIZE
+        priced_at = datetime.utcnow()
+        chunks = []
+        
+        for index, start in enumerate(range(0, len(symbols), size)):
+            chunk = symbols[start:start + size]
+            began = time.perf_counter()
+            # Each row carries its quote's own timestamp so a stale or fallback quote is not stamped as fresh
+            price_map = values(column("symbol", String), column("price", Numeric(15, 2)), column("quoted_at", DateTime),
+                               name="price_map").data(
+                [(symbol, quotes[symbol]["price"], quotes[symbol].get("timestamp") or priced_at) for symbol in chunk])
+            price = cast(price_map.c.price, Numeric(15, 2))
+            stmt = (
+                update(Investment)
+                .where(Investment.symbol == price_map.c.symbol)
+                .values(last_price=price, current_value=Investment.units * price,
+                        last_price_at=cast(price_map.c.quoted_at, DateTime))
+            )
+            with bind.begin() as conn:
+                rows = conn.execute(stmt).rowcount
+            chunks.append({"chunk": index, "symbols": len(chunk), "rows": rows,
+                           "seconds": round(time.perf_counter() - began, 3)})
+        
+        return {"updated": sum(c["rows"] for c in chunks), "symbols": len(symbols), "chunks": chunks}
+
+valuation_service = ValuationService()
\ No newline at end of file
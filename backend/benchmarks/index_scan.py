@@ -0,0 +1,142 @@
+"""EXPLAIN ANALYZE of the per-user queries before and after the composite indexes.
+
+Copies the tables into a scratch ``bench`` schema, fills them with synthetic
+rows, plans every query without the indexes added in migration 0003, creates
+them and plans again.  Run from ``backend/`` against a disposable database:
+
+    python -m benchmarks.index_scan --rows 10000000 --users 100000
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+from sqlalchemy import MetaData, create_engine, desc, func, select, text
+from sqlalchemy.engine import Connection
+from app.config import settings
+from app.database import Base
+from app import models  # noqa: F401
+
+SCHEMA = "bench"
+TABLES = ("users", "goals", "investments", "transactions", "simulations")
+PER_USER_INDEXES = {
+    "ix_goals_user_id_id",
+    "ix_investments_user_id_id",
+    "ix_investments_user_id_symbol",
+    "ix_investments_symbol",
+    "ix_transactions_user_id_symbol_executed_at",
+    "ix_transactions_user_id_executed_at",
+    "ix_simulations_user_id_created_at_id",
+}
+SYMBOLS = 5000
+
+POPULATE = {
+    "users": """
+        INSERT INTO bench.users (id, name, email, password, risk_profile, kyc_status, created_at)
+        SELECT g, 'user ' || g, 'user' || g || '@example.com', 'x', 'moderate', 'unverified', now()
+        FROM generate_series(1, :users) g""",
+    "investments": """
+        INSERT INTO bench.investments (user_id, asset_type, symbol, units, avg_buy_price, cost_basis, current_value, last_price)
+        SELECT 1 + (g * 7919) % :users, 'stock', 'SYM' || g % :symbols, 10, 100, 1000, 1000, 100
+        FROM generate_series(1, :rows) g""",
+    "transactions": """
+        INSERT INTO bench.transactions (user_id, symbol, type, quantity, price, fees, executed_at)
+        SELECT 1 + (g * 7919) % :users, 'SYM' || g % :symbols, 'buy', 1, 100, 0, now() - g * interval '1 second'
+        FROM generate_series(1, :rows) g""",
+    "goals": """
+        INSERT INTO bench.goals (user_id, goal_type, target_amount, target_date, monthly_contribution, status, created_at)
+        SELECT 1 + (g * 7919) % :users, 'retirement', 100000, current_date + 3650, 500, 'active', now()
+        FROM generate_series(1, :rows / 10) g""",
+    "simulations": """
+        INSERT INTO bench.simulations (user_id, scenario_name, assumptions, results, created_at)
+        SELECT 1 + (g * 7919) % :users, 'scenario ' || g, '{}', '{}', now() - g * interval '1 second'
+        FROM generate_series(1, :rows / 10) g""",
+}
+
+def build_schema(conn: Connection) -> Dict:
+    metadata = MetaData()
+    tables = {name: Base.metadata.tables[name].to_metadata(metadata, schema=SCHEMA) for name in TABLES}
+    deferred = []
+    for table in tables.values():
+        for index in list(table.indexes):
+            if index.name in PER_USER_INDEXES:
+                table.indexes.discard(index)
+                deferred.append(index)
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    metadata.create_all(conn)
+    return {"tables": tables, "indexes": deferred}
+
+def populate(conn: Connection, rows: int, users: int) -> None:
+    for name in ("users", "investments", "transactions", "goals", "simulations"):
+        start = time.perf_counter()
+        conn.execute(text(POPULATE[name]), {"rows": rows, "users": users, "symbols": SYMBOLS})
+        conn.execute(text(f"ANALYZE {SCHEMA}.{name}"))
+        print(f"Loaded {SCHEMA}.{name} in {time.perf_counter() - start:.1f}s")
+
+def queries(tables: Dict, user_id: int, symbol: str) -> Dict:
+    inv, txn, goals, sims = tables["investments"], tables["transactions"], tables["goals"], tables["simulations"]
+    return {
+        "goals list page": select(goals).where(goals.c.user_id == user_id).order_by(goals.c.id).limit(101),
+        "investments list page": select(inv).where(inv.c.user_id == user_id).order_by(inv.c.id).limit(101),
+        "portfolio summary": (select(inv.c.asset_type, func.sum(inv.c.current_value))
+                              .where(inv.c.user_id == user_id).group_by(inv.c.asset_type)),
+        "refresh by symbol": select(func.count()).select_from(inv).where(inv.c.symbol == symbol),
+        "transactions list": (select(txn).where(txn.c.user_id == user_id)
+                              .order_by(desc(txn.c.executed_at), desc(txn.c.id))),
+        "ledger by symbol": (select(txn).where(txn.c.user_id == user_id, txn.c.symbol == symbol)
+                             .order_by(txn.c.executed_at, txn.c.id)),
+        "simulations list page": (select(sims).where(sims.c.user_id == user_id)
+                                  .order_by(desc(sims.c.created_at), desc(sims.c.id)).limit(101)),
+    }
+
+def scan_nodes(plan: Dict) -> List[str]:
+    nodes = [plan["Node Type"]] if "Scan" in plan["Node Type"] else []
+    for child in plan.get("Plans", []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+def explain(conn: Connection, statement) -> Dict:
+    sql = str(statement.compile(conn, compile_kwargs={"literal_binds": True}))
+    result = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()
+    report = (json.loads(result) if isinstance(result, str) else result)[0]
+    return {"scans": ", ".join(dict.fromkeys(scan_nodes(report["Plan"]))), "ms": report["Execution Time"]}
+
+def explain_all(conn: Connection, statements: Dict) -> Dict:
+    return {label: explain(conn, statement) for label, statement in statements.items()}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-user query plans with and without composite indexes")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="investments and transactions rows")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--keep", action="store_true", help="leave the bench schema in place")
+    args = parser.parse_args()
+    
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.begin() as conn:
+        schema = build_schema(conn)
+        populate(conn, args.rows, args.users)
+    
+    user_id = args.users // 2
+    with engine.begin() as conn:
+        symbol = conn.execute(select(schema["tables"]["transactions"].c.symbol)
+                              .where(schema["tables"]["transactions"].c.user_id == user_id).limit(1)).scalar()
+        statements = queries(schema["tables"], user_id, symbol)
+        before = explain_all(conn, statements)
+        for index in schema["indexes"]:
+            start = time.perf_counter()
+            index.create(conn)
+            print(f"Built {index.name} in {time.perf_counter() - start:.1f}s")
+        for name in TABLES:
+            conn.execute(text(f"ANALYZE {SCHEMA}.{name}"))
+        after = explain_all(conn, statements)
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    
+    print(f"\n{args.rows:,} rows, {args.users:,} users, user_id={user_id}, symbol={symbol}")
+    print(f"{'query':<24}{'before':<36}{'after':<36}")
+    for label in statements:
+        b, a = before[label], after[label]
+        print(f"{label:<24}{b['scans'][:26]:<26}{b['ms']:>8.2f} ms  {a['scans'][:26]:<26}{a['ms']:>8.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Drive get_multiple_prices against the offline local provider.
+
+No network is touched: MARKET_PROVIDERS is forced to the local provider
+before the app modules are imported.  Run from ``backend/``:
+
+    python -m benchmarks.market_fetch --symbols 10000 --rounds 5
+"""
+import argparse
+import os
+import time
+
+os.environ["MARKET_PROVIDERS"] = '["local"]'
+
+from app.market_service import market_service  # noqa: E402
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure bulk quote throughput with the local provider")
+    parser.add_argument("--symbols", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    
+    symbols = [f"SYM{i:06d}" for i in range(args.symbols)]
+    market_service.get_multiple_prices(symbols[:100])
+    
+    timings = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        prices = market_service.get_multiple_prices(symbols)
+        timings.append(time.perf_counter() - start)
+        missing = sum(1 for quote in prices.values() if quote is None)
+        if missing:
+            raise SystemExit(f"❌ {missing} symbols returned no quote")
+    
+    best, mean = min(timings), sum(timings) / len(timings)
+    print(f"{args.symbols:,} symbols x {args.rounds} rounds: best {best * 1000:.1f} ms "
+          f"({args.symbols / best:,.0f} symbols/s), mean {mean * 1000:.1f} ms ({args.symbols / mean:,.0f} symbols/s)")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
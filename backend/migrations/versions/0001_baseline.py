@@ -0,0 +1,124 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+Databases that were created by the old startup ``create_all`` already have
+these tables; the upgrade leaves them untouched so they can be brought under
+migration control with a plain ``alembic upgrade head``. Offline (``--sql``)
+runs assume an empty database.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ENUMS = {
+    "riskprofile": ("conservative", "moderate", "aggressive"),
+    "kycstatus": ("unverified", "verified"),
+    "goaltype": ("retirement", "home", "education", "custom"),
+    "goalstatus": ("active", "paused", "completed"),
+    "assettype": ("stock", "etf", "mutual_fund", "bond", "cash"),
+    "transactiontype": ("buy", "sell", "dividend", "contribution", "withdrawal"),
+}
+
+
+def _enum(name: str) -> sa.Enum:
+    return sa.Enum(*ENUMS[name], name=name)
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table("users"):
+        return
+    
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("risk_profile", _enum("riskprofile"), nullable=True),
+        sa.Column("kyc_status", _enum("kycstatus"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    
+    op.create_table(
+        "goals",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("goal_type", _enum("goaltype"), nullable=False),
+        sa.Column("target_amount", sa.Numeric(15, 2), nullable=False),
+        sa.Column("target_date", sa.Date(), nullable=False),
+        sa.Column("monthly_contribution", sa.Numeric(15, 2), nullable=False),
+        sa.Column("status", _enum("goalstatus"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_goals_id", "goals", ["id"])
+    
+    op.create_table(
+        "investments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("asset_type", _enum("assettype"), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("units", sa.Numeric(15, 4), nullable=False),
+        sa.Column("avg_buy_price", sa.Numeric(15, 2), nullable=False),
+        sa.Column("cost_basis", sa.Numeric(15, 2), nullable=False),
+        sa.Column("current_value", sa.Numeric(15, 2), nullable=True),
+        sa.Column("last_price", sa.Numeric(15, 2), nullable=True),
+        sa.Column("last_price_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_investments_id", "investments", ["id"])
+    
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("type", _enum("transactiontype"), nullable=False),
+        sa.Column("quantity", sa.Numeric(15, 4), nullable=False),
+        sa.Column("price", sa.Numeric(15, 2), nullable=False),
+        sa.Column("fees", sa.Numeric(15, 2), nullable=True),
+        sa.Column("executed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_transactions_id", "transactions", ["id"])
+    
+    op.create_table(
+        "recommendations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("recommendation_text", sa.Text(), nullable=False),
+        sa.Column("suggested_allocation", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_recommendations_id", "recommendations", ["id"])
+    
+    op.create_table(
+        "simulations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("goal_id", sa.Integer(), sa.ForeignKey("goals.id"), nullable=True),
+        sa.Column("scenario_name", sa.String(), nullable=False),
+        sa.Column("assumptions", postgresql.JSONB(), nullable=False),
+        sa.Column("results", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_simulations_id", "simulations", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("simulations", "recommendations", "transactions", "investments", "goals", "users"):
+        op.drop_table(table)
+    for name in ENUMS:
+        _enum(name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,56 @@
+"""portfolio snapshots and simulation assumptions hash
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:05:00.000000
+
+Both objects may already exist where the old startup ``create_all`` ran after
+they were added to the models, so each step checks the live schema first.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        columns, indexes, snapshots_exist = set(), set(), False
+    else:
+        inspector = sa.inspect(op.get_bind())
+        columns = {column["name"] for column in inspector.get_columns("simulations")}
+        indexes = {index["name"] for index in inspector.get_indexes("simulations")}
+        snapshots_exist = inspector.has_table("portfolio_snapshots")
+    
+    if "assumptions_hash" not in columns:
+        op.add_column("simulations", sa.Column("assumptions_hash", sa.String(64), nullable=True))
+    if "ix_simulations_assumptions_hash" not in indexes:
+        op.create_index("ix_simulations_assumptions_hash", "simulations", ["assumptions_hash"])
+    
+    if not snapshots_exist:
+        op.create_table(
+            "portfolio_snapshots",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("snapshot_date", sa.Date(), nullable=False),
+            sa.Column("total_value", sa.Numeric(15, 2), nullable=False),
+            sa.Column("total_cost", sa.Numeric(15, 2), nullable=False),
+            sa.Column("num_positions", sa.Integer(), nullable=False),
+            sa.Column("allocation", postgresql.JSONB(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("user_id", "snapshot_date", name="uq_portfolio_snapshots_user_date"),
+        )
+        op.create_index("ix_portfolio_snapshots_id", "portfolio_snapshots", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("portfolio_snapshots")
+    op.drop_index("ix_simulations_assumptions_hash", table_name="simulations")
+    op.drop_column("simulations", "assumptions_hash")
@@ -0,0 +1,42 @@
+"""composite indexes for per-user queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:10:00.000000
+
+Indexes are built with CREATE INDEX CONCURRENTLY so large tables stay
+writable during the upgrade; that cannot run inside a transaction, hence the
+autocommit block.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_goals_user_id_id", "goals", ["user_id", "id"]),
+    ("ix_investments_user_id_id", "investments", ["user_id", "id"]),
+    ("ix_investments_user_id_symbol", "investments", ["user_id", "symbol"]),
+    ("ix_investments_symbol", "investments", ["symbol"]),
+    ("ix_transactions_user_id_symbol_executed_at", "transactions", ["user_id", "symbol", "executed_at", "id"]),
+    ("ix_transactions_user_id_executed_at", "transactions", ["user_id", "executed_at", "id"]),
+    ("ix_recommendations_user_id_created_at", "recommendations", ["user_id", "created_at"]),
+    ("ix_simulations_user_id_created_at_id", "simulations", ["user_id", "created_at", "id"]),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,25 @@
+"""user birth date for age-aware allocation
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("birth_date", sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "birth_date")
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""single nightly system recommendation per user
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recommendations", sa.Column("source", sa.String(), nullable=False, server_default="user"))
+    op.create_index("uq_recommendations_user_id_system", "recommendations", ["user_id"], unique=True,
+                    postgresql_where=sa.text("source = 'system'"))
+
+
+def downgrade() -> None:
+    op.drop_index("uq_recommendations_user_id_system", table_name="recommendations")
+    op.drop_column("recommendations", "source")
@@ -0,0 +1,54 @@
+import io
+import pytest
+from app.config import settings
+from app.import_service import ImportService
+from app.models import Investment, Transaction
+
+@pytest.fixture(autouse=True)
+def _small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "PROJECTION_CACHE_USE_REDIS", False)
+
+def _csv(*rows: str) -> io.BytesIO:
+    return io.BytesIO(("\n".join(("asset_type,symbol,units,avg_buy_price",) + rows) + "\n").encode())
+
+def test_integrity_error_rejects_only_the_offending_row(db, monkeypatch):
+    rows = ImportService.investment_rows
+    # A NULL symbol trips the NOT NULL constraint in the database rather than in validation
+    monkeypatch.setattr(ImportService, "investment_rows", staticmethod(
+        lambda user_id, investments: [{**row, "symbol": None} if row["symbol"] == "BAD" else row
+                                      for row in rows(user_id, investments)]))
+    report = ImportService().run(db, 1, "investments", _csv("stock,AAPL,1,100", "stock,BAD,1,100", "stock,MSFT,1,100"), "csv")
+    assert report["inserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [3]
+    assert sorted(inv.symbol for inv in db.query(Investment).all()) == ["AAPL", "MSFT"]
+
+def test_type_error_in_ledger_is_reported_per_row(db, monkeypatch):
+    record = ImportService._record_transactions
+    
+    def flaky(db, user_id, transactions):
+        if any(txn.symbol == "BAD" for txn in transactions):
+            raise TypeError("can't compare offset-naive and offset-aware datetimes")
+        record(db, user_id, transactions)
+    
+    monkeypatch.setattr(ImportService, "_record_transactions", staticmethod(flaky))
+    stream = io.BytesIO(b"symbol,type,quantity,price\nAAPL,buy,1,100\nBAD,buy,1,100\n")
+    report = ImportService().run(db, 1, "transactions", stream, "csv")
+    assert report["inserted"] == 1
+    assert report["errors"] == [{"line": 3, "error": "can't compare offset-naive and offset-aware datetimes"}]
+    assert db.query(Transaction).count() == 1
+
+def test_resume_skips_committed_lines(db):
+    stream = _csv("stock,AAPL,1,100", "stock,MSFT,1,100", "stock,GOOG,1,100", "stock,AMZN,1,100")
+    resume = {"processed": 2, "inserted": 2, "failed": 0, "errors": [], "committed_line": 3}
+    report = ImportService().run(db, 1, "investments", stream, "csv", resume=resume)
+    assert report["processed"] == 4
+    assert report["inserted"] == 4
+    assert report["committed_line"] == 5
+    assert sorted(inv.symbol for inv in db.query(Investment).all()) == ["AMZN", "GOOG"]
+
+def test_progress_is_reported_after_every_commit(db):
+    snapshots = []
+    ImportService().run(db, 1, "investments", _csv("stock,AAPL,1,100", "stock,MSFT,1,100", "stock,GOOG,1,100"), "csv",
+                        progress=lambda report: snapshots.append(report["committed_line"]))
+    assert snapshots == [3, 4]
@@ -0,0 +1,130 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from app.ledger_service import LedgerService, naive_utc
+from app.models import AssetType, Investment, Transaction, TransactionType
+from app.schemas import TransactionCreate
+
+def _txn(symbol="AAPL", type="buy", quantity=10, price=100, **kwargs) -> TransactionCreate:
+    return TransactionCreate(symbol=symbol, type=type, quantity=quantity, price=price, **kwargs)
+
+def _lot(db, units, cost_basis, symbol="AAPL"):
+    inv = Investment(user_id=1, asset_type=AssetType.stock, symbol=symbol, units=units, avg_buy_price=cost_basis / units,
+                     cost_basis=cost_basis, current_value=cost_basis, last_price=cost_basis / units)
+    db.add(inv)
+    db.commit()
+    return inv
+
+def _positions(db, symbol="AAPL"):
+    return db.query(Investment).filter(Investment.user_id == 1, Investment.symbol == symbol).all()
+
+def test_apply_buy_adds_units_and_fees_to_cost():
+    units, cost = LedgerService.apply(Decimal(0), Decimal(0), TransactionType.buy, Decimal(10), Decimal(100), Decimal(5))
+    assert units == Decimal(10)
+    assert cost == Decimal(1005)
+
+def test_apply_sell_reduces_cost_proportionally():
+    units, cost = LedgerService.apply(Decimal(10), Decimal(1000), TransactionType.sell, Decimal(4), Decimal(150), Decimal(0))
+    assert units == Decimal(6)
+    assert cost == Decimal(600)
+
+def test_apply_rejects_oversell():
+    with pytest.raises(ValueError, match="only 10 held"):
+        LedgerService.apply(Decimal(10), Decimal(1000), TransactionType.sell, Decimal(11), Decimal(100), Decimal(0), "AAPL")
+
+def test_update_positions_rejects_oversell(db):
+    _lot(db, 5, 500)
+    with pytest.raises(ValueError):
+        LedgerService.update_positions(db, 1, [_txn(type="sell", quantity=6)])
+
+def test_update_positions_rejects_sell_without_position(db):
+    with pytest.raises(ValueError, match="no position held"):
+        LedgerService.update_positions(db, 1, [_txn(type="sell", quantity=1)])
+
+def test_update_positions_sells_lots_first_in_first_out(db):
+    first = _lot(db, 5, 500)
+    second = _lot(db, 5, 600)
+    LedgerService.update_positions(db, 1, [_txn(type="sell", quantity=8, price=120)])
+    db.commit()
+    
+    positions = _positions(db)
+    assert [inv.id for inv in positions] == [second.id]
+    assert Decimal(positions[0].units) == Decimal(2)
+    assert Decimal(positions[0].cost_basis) == Decimal("240.00")
+    assert first.id not in {inv.id for inv in positions}
+
+def test_update_positions_partial_sell_keeps_every_lot(db):
+    first = _lot(db, 5, 500)
+    second = _lot(db, 5, 600)
+    LedgerService.update_positions(db, 1, [_txn(type="sell", quantity=2, price=120)])
+    db.commit()
+    
+    positions = _positions(db)
+    assert [inv.id for inv in positions] == [first.id, second.id]
+    assert [Decimal(inv.units) for inv in positions] == [Decimal(3), Decimal(5)]
+    assert [Decimal(inv.cost_basis) for inv in positions] == [Decimal("300.00"), Decimal("600.00")]
+
+def test_update_positions_buy_adds_to_newest_lot(db):
+    first = _lot(db, 5, 500)
+    second = _lot(db, 5, 600)
+    LedgerService.update_positions(db, 1, [_txn(quantity=10, price=100)])
+    db.commit()
+    
+    positions = _positions(db)
+    assert [inv.id for inv in positions] == [first.id, second.id]
+    assert [Decimal(inv.units) for inv in positions] == [Decimal(5), Decimal(15)]
+    assert Decimal(positions[1].cost_basis) == Decimal("1600.00")
+
+def test_update_positions_orders_mixed_timezones(db):
+    transactions = [
+        _txn(type="sell", quantity=5, executed_at="2024-01-05T10:00:00Z"),
+        _txn(quantity=10, executed_at=datetime(2024, 1, 5, 9, 0)),
+        _txn(quantity=1)
+    ]
+    LedgerService.update_positions(db, 1, transactions)
+    db.commit()
+    assert Decimal(_positions(db)[0].units) == Decimal(6)
+
+def test_transaction_rows_store_naive_utc():
+    rows = LedgerService.transaction_rows(1, [_txn(executed_at="2024-01-05T10:00:00+02:00")])
+    assert rows[0]["executed_at"] == datetime(2024, 1, 5, 8, 0)
+    assert naive_utc(None) is None
+
+def test_rebuild_compares_ledger_against_all_lots(db):
+    _lot(db, 5, 500)
+    _lot(db, 5, 500)
+    db.add_all([
+        Transaction(user_id=1, symbol="AAPL", type=TransactionType.buy, quantity=5, price=100, fees=0,
+                    executed_at=datetime(2024, 1, 1)),
+        Transaction(user_id=1, symbol="AAPL", type=TransactionType.buy, quantity=5, price=100, fees=0,
+                    executed_at=datetime(2024, 1, 2))
+    ])
+    db.commit()
+    
+    report = LedgerService.rebuild(db, user_id=1)
+    assert report["checked"] == 1
+    assert report["mismatches"] == []
+def test_rebuild_apply_keeps_lot_rows(db):
+    first = _lot(db, 5, 500)
+    second = _lot(db, 5, 500)
+    db.add(Transaction(user_id=1, symbol="AAPL", type=TransactionType.buy, quantity=20, price=100, fees=0,
+                       executed_at=datetime(2024, 1, 1)))
+    db.commit()
+    
+    report = LedgerService.rebuild(db, user_id=1, apply=True)
+    assert len(report["mismatches"]) == 1
+    positions = _positions(db)
+    assert [inv.id for inv in positions] == [first.id, second.id]
+    assert sum(Decimal(inv.units) for inv in positions) == Decimal(20)
+    assert sum(Decimal(inv.cost_basis) for inv in positions) == Decimal("2000.00")
+
+def test_rebuild_reports_holdings_without_ledger(db):
+    _lot(db, 5, 500, symbol="BRK.B")
+    _lot(db, 5, 500, symbol="MSFT")
+    db.add(Transaction(user_id=1, symbol="BRKA", type=TransactionType.buy, quantity=1, price=100, fees=0,
+                       executed_at=datetime(2024, 1, 1)))
+    db.commit()
+    
+    report = LedgerService.rebuild(db, user_id=1)
+    assert [holding["symbol"] for holding in report["untracked"]] == ["BRK.B", "MSFT"]
+    assert [mismatch["symbol"] for mismatch in report["mismatches"]] == ["BRKA"]
\ No newline at end of file